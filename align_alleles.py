@@ -0,0 +1,522 @@
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import groupby, islice
+
+import numpy as np
+from Bio import Align
+from Bio.Align import substitution_matrices
+
+
+# aligners of the current worker process, created once by init_worker
+_aligner = None
+_protein_aligner = None
+
+# number of diagonals on each side of the main diagonal searched by the
+# banded alignment
+BAND_WIDTH = 32
+
+# the banded alignment is only used when it fills at most BANDED_MAX_CELLS
+# cells, and when it costs less than the full alignment of the same sequences,
+# counting the numpy calls of one banded row as BANDED_ROW_COST cells of the
+# aligner (see use_banded)
+BANDED_MAX_CELLS = 1 << 20
+BANDED_ROW_COST = 1800
+
+
+"""
+parameters:
+    protein: create the aligner used for protein sequences (BLOSUM62 scores,
+        affine gaps) instead of the one used for nucleotide sequences
+
+returns:
+    the aligner used to compare two versions of an allele
+"""
+def create_aligner(protein=False):
+    if not protein:
+        return Align.PairwiseAligner()
+    aligner = Align.PairwiseAligner()
+    aligner.substitution_matrix = substitution_matrices.load('BLOSUM62')
+    aligner.open_gap_score = -10
+    aligner.extend_gap_score = -0.5
+    return aligner
+
+
+"""
+parameters:
+    fast: whether the fast path (align_pair_fast) is used
+    protein: whether the protein path (align_pair_protein) is used
+
+returns:
+    a key that changes whenever the alignments could change, used to cache
+    alignment results
+"""
+def aligner_parameters(fast=False, protein=False):
+    if protein:
+        description = f'{create_aligner(True)}\nprotein: True\n'
+    else:
+        description = (f'{create_aligner()}\nfast: {fast}\nband: {BAND_WIDTH if fast else None}\n'
+                       f'cells: {(BANDED_MAX_CELLS, BANDED_ROW_COST) if fast else None}\n')
+    return hashlib.blake2b(description.encode(), digest_size=16).hexdigest()
+
+
+"""
+creates the aligners that are reused for every alignment run by a worker process
+"""
+def init_worker():
+    global _aligner, _protein_aligner
+    _aligner = create_aligner()
+    _protein_aligner = create_aligner(True)
+
+
+"""
+aligns two versions of an allele
+
+parameters:
+    sequence1: new sequence (str or PackedSequence)
+    sequence2: old sequence (str or PackedSequence)
+    aligner: the aligner to use, defaults to the aligner of the worker process
+
+returns:
+    the cigar string of the changes from sequence2 to sequence1
+"""
+def align_pair(sequence1, sequence2, aligner=None):
+    if aligner is None:
+        if _aligner is None:
+            init_worker()
+        aligner = _aligner
+    return alignment_cigar(aligner.align(str(sequence1), str(sequence2))[0])
+
+
+"""
+builds the cigar string from the coordinates of an alignment, without
+formatting the gapped sequences. '=' and 'X' are used for matched and
+mismatched bases, 'I' for bases only in the target (new sequence) and 'D' for
+bases only in the query (old sequence)
+
+parameters:
+    alignment: alignment of the new sequence (target) to the old sequence (query)
+
+returns:
+    the cigar string
+"""
+def alignment_cigar(alignment):
+    sequence1, sequence2 = alignment.target, alignment.query
+    coordinates = alignment.coordinates.tolist()
+    runs = []
+    points = list(zip(*coordinates))
+    for (start1, start2), (end1, end2) in zip(points, points[1:]):
+        if end1 > start1 and end2 > start2:
+            runs += match_runs(sequence1[start1:end1], sequence2[start2:end2])
+        elif end1 > start1:
+            runs.append((end1 - start1, 'I'))
+        elif end2 > start2:
+            runs.append((end2 - start2, 'D'))
+    return format_cigar(runs)
+
+
+"""
+parameters:
+    sequence1: first sequence
+    sequence2: second sequence, of the same length
+
+returns:
+    list of (count, operation) runs of matched ('=') and mismatched ('X') bases
+"""
+def match_runs(sequence1, sequence2):
+    if sequence1 == sequence2:
+        return [(len(sequence1), '=')]
+    mismatch = np.frombuffer(sequence1.encode(), dtype=np.uint8) != np.frombuffer(sequence2.encode(), dtype=np.uint8)
+    ends = np.append(np.flatnonzero(mismatch[1:] != mismatch[:-1]) + 1, len(mismatch))
+    starts = np.insert(ends[:-1], 0, 0)
+    return [(end - start, 'X' if different else '=')
+            for start, end, different in zip(starts.tolist(), ends.tolist(), mismatch[starts].tolist())]
+
+
+"""
+parameters:
+    sequence1: first sequence
+    sequence2: second sequence
+
+returns:
+    the length of the longest common prefix of the two sequences
+"""
+def common_prefix_length(sequence1, sequence2):
+    low, high = 0, min(len(sequence1), len(sequence2))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if sequence1[low:middle] == sequence2[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+"""
+parameters:
+    sequence1: first sequence
+    sequence2: second sequence
+    limit: maximum length of the suffix
+
+returns:
+    the length of the longest common suffix of the two sequences
+"""
+def common_suffix_length(sequence1, sequence2, limit):
+    low, high = 0, limit
+    end1, end2 = len(sequence1), len(sequence2)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if sequence1[end1 - middle:end1 - low] == sequence2[end2 - middle:end2 - low]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+"""
+parameters:
+    length1: length of the new sequence
+    length2: length of the old sequence
+    band: number of extra diagonals on each side of the band
+
+returns:
+    the number of cells filled by banded_alignment
+"""
+def banded_cells(length1, length2, band=BAND_WIDTH):
+    return length1 * (abs(length2 - length1) + 2 * band + 1)
+
+
+"""
+parameters:
+    length1: length of the new sequence
+    length2: length of the old sequence
+    band: number of extra diagonals on each side of the band
+
+returns:
+    True if banded_alignment fits in BANDED_MAX_CELLS and is expected to be
+    faster than the full aligner for sequences of these lengths
+"""
+def use_banded(length1, length2, band=BAND_WIDTH):
+    cells = banded_cells(length1, length2, band)
+    return cells <= BANDED_MAX_CELLS and length1 * BANDED_ROW_COST + cells <= length1 * length2
+
+
+"""
+global alignment restricted to the diagonals close to the main diagonal,
+scored like the given aligner (which must use the same score for every gap).
+the cells of a row are filled at once with numpy: the diagonal and vertical
+moves only depend on the row before, and the best horizontal move is a
+running maximum along the row
+
+parameters:
+    sequence1: new sequence
+    sequence2: old sequence
+    aligner: the aligner to take the scores from
+    band: number of extra diagonals on each side of the band
+
+returns:
+    list of (count, operation) runs, or None if an alignment outside of the
+    band could score better
+"""
+def banded_alignment(sequence1, sequence2, aligner, band=BAND_WIDTH):
+    match_score = aligner.match_score
+    mismatch_score = aligner.mismatch_score
+    gap_score = aligner.gap_score
+    n, m = len(sequence1), len(sequence2)
+    low = min(0, m - n) - band
+    high = max(0, m - n) + band
+    width = high - low + 1
+
+    # cell d of row i is the cell of column j = i + low + d of the full matrix,
+    # so the diagonal move comes from cell d and the vertical move from cell
+    # d + 1 of the row before. scores has one more cell of -inf on every row
+    # for the vertical move of the last cell
+    columns = np.arange(n + 1)[:, None] + (low + np.arange(width))
+    outside = np.where((columns < 0) | (columns > m), -np.inf, 0.0)
+    codes1 = np.frombuffer(sequence1.encode(), dtype=np.uint8)
+    codes2 = np.frombuffer(b'\0' + sequence2.encode(), dtype=np.uint8)
+    same = codes1[:, None] == codes2[np.clip(columns[1:], 0, m)]
+    diagonal_scores = np.where(same, match_score, mismatch_score) + outside[1:]
+    gaps = gap_score * np.arange(width)
+    scores = np.empty((n + 1, width + 1))
+    scores[:, width] = -np.inf
+    scores[0, :width] = gaps + gap_score * low + outside[0]
+    diagonal_moves = np.empty((n, width), dtype=bool)
+    horizontal_moves = np.empty((n, width), dtype=bool)
+    vertical = np.empty(width)
+    best = np.empty(width)
+    for previous, row, diagonal_score, diagonal_move, horizontal_move in zip(
+            scores[:-1], scores[1:, :width], diagonal_scores, diagonal_moves, horizontal_moves):
+        np.add(previous[:width], diagonal_score, out=best)
+        np.add(previous[1:], gap_score, out=vertical)
+        np.greater_equal(best, vertical, out=diagonal_move)
+        np.maximum(best, vertical, out=best)
+        if gap_score:
+            np.subtract(best, gaps, out=row)
+            np.maximum.accumulate(row, out=row)
+            row += gaps
+        else:
+            np.maximum.accumulate(best, out=row)
+        np.greater(row, best, out=horizontal_move)
+
+    # best score of any alignment that leaves the band: it has to use at least
+    # high + 1 deletions or 1 - low insertions
+    deletions = high + 1
+    insertions = 1 - low
+    outside_score = max(match_score * (m - deletions) + gap_score * (n - m + 2 * deletions),
+                        match_score * (n - insertions) + gap_score * (m - n + 2 * insertions))
+    if scores[n, m - n - low] < outside_score:
+        return None
+
+    moves = np.where(horizontal_moves, ord('D'), np.where(diagonal_moves, ord('M'), ord('I')))
+    moves = moves.astype(np.uint8).tobytes()
+    operations = []
+    i, d = n, m - n - low
+    while i > 0:
+        move = moves[(i - 1) * width + d]
+        operations.append(move)
+        if move == ord('M'):
+            i -= 1
+        elif move == ord('I'):
+            i -= 1
+            d += 1
+        else:
+            d -= 1
+    operations += [ord('D')] * (d + low)
+    operations.reverse()
+    runs = []
+    i = j = 0
+    for move, group in groupby(operations):
+        count = len(list(group))
+        if move == ord('M'):
+            runs += match_runs(sequence1[i:i + count], sequence2[j:j + count])
+            i += count
+            j += count
+        elif move == ord('I'):
+            runs.append((count, 'I'))
+            i += count
+        else:
+            runs.append((count, 'D'))
+            j += count
+    return runs
+
+
+"""
+parameters:
+    cigar_string: the cigar string
+
+returns:
+    list of (count, operation) runs
+"""
+def cigar_runs(cigar_string):
+    return [(int(count), operation) for count, operation in re.findall(r'(\d+)(\D)', cigar_string)]
+
+
+"""
+parameters:
+    runs: list of (count, operation) runs
+
+returns:
+    the cigar string, with neighbouring runs of the same operation merged
+"""
+def format_cigar(runs):
+    cigar = []
+    for count, operation in runs:
+        if count == 0:
+            continue
+        if cigar and cigar[-1][1] == operation:
+            cigar[-1] = (cigar[-1][0] + count, operation)
+        else:
+            cigar.append((count, operation))
+    return ''.join(f'{count}{operation}' for count, operation in cigar)
+
+
+"""
+fast version of align_pair for alleles that only differ in a few places. the
+longest common prefix and suffix are removed, and only the part in between is
+aligned with a banded alignment. the part in between is aligned with the full
+aligner if the band is too narrow to be sure the banded alignment is the best,
+or if the banded alignment would be slower (see use_banded).
+the cigar string is in the same format as the one from align_pair
+
+parameters:
+    sequence1: new sequence
+    sequence2: old sequence
+    aligner: the aligner to use when the band is too narrow
+    band: number of extra diagonals on each side of the band
+
+returns:
+    the cigar string of the changes from sequence2 to sequence1
+"""
+def align_pair_fast(sequence1, sequence2, aligner=None, band=BAND_WIDTH):
+    if aligner is None:
+        if _aligner is None:
+            init_worker()
+        aligner = _aligner
+    sequence1, sequence2 = str(sequence1), str(sequence2)
+    prefix = common_prefix_length(sequence1, sequence2)
+    limit = min(len(sequence1), len(sequence2)) - prefix
+    suffix = common_suffix_length(sequence1, sequence2, limit)
+    core1 = sequence1[prefix:len(sequence1) - suffix]
+    core2 = sequence2[prefix:len(sequence2) - suffix]
+    if not core1:
+        core = [(len(core2), 'D')]
+    elif not core2:
+        core = [(len(core1), 'I')]
+    else:
+        core = None
+        if use_banded(len(core1), len(core2), band):
+            core = banded_alignment(core1, core2, aligner, band)
+        if core is None:
+            core = cigar_runs(align_pair(core1, core2, aligner))
+    return format_cigar([(prefix, '=')] + core + [(suffix, '=')])
+
+
+"""
+compares two versions of a protein. proteins of the same length are compared
+residue by residue, so the cigar string only has '=' and 'X' runs (the
+substituted residues). proteins of different lengths are aligned with the
+protein aligner
+
+parameters:
+    sequence1: new sequence
+    sequence2: old sequence
+    aligner: the aligner to use, defaults to the protein aligner of the worker process
+
+returns:
+    the cigar string of the changes from sequence2 to sequence1
+"""
+def align_pair_protein(sequence1, sequence2, aligner=None):
+    sequence1, sequence2 = str(sequence1), str(sequence2)
+    if len(sequence1) == len(sequence2):
+        return format_cigar(match_runs(sequence1, sequence2))
+    if aligner is None:
+        if _protein_aligner is None:
+            init_worker()
+        aligner = _protein_aligner
+    return alignment_cigar(aligner.align(sequence1, sequence2)[0])
+
+
+"""
+parameters:
+    batch: list of (new sequence, old sequence) pairs
+    fast: use align_pair_fast instead of align_pair
+    protein: use align_pair_protein instead of align_pair
+
+returns:
+    list of the cigar strings of each pair
+"""
+def align_batch(batch, fast=False, protein=False):
+    if protein:
+        align = align_pair_protein
+    else:
+        align = align_pair_fast if fast else align_pair
+    return [align(sequence1, sequence2) for sequence1, sequence2 in batch]
+
+
+"""
+parameters:
+    pairs: iterable of items
+    batch_size: number of items in a batch
+
+returns:
+    generator of lists of at most batch_size items
+"""
+def batches(pairs, batch_size):
+    pairs = iter(pairs)
+    batch = list(islice(pairs, batch_size))
+    while batch:
+        yield batch
+        batch = list(islice(pairs, batch_size))
+
+
+"""
+aligns (new sequence, old sequence) pairs on a pool of worker processes. pairs
+are sent to the workers in batches, and every worker reuses one aligner.
+prints the throughput once every pair is aligned
+
+parameters:
+    pairs: iterable of (new sequence, old sequence) pairs
+    processes: number of worker processes, defaults to the number of cpus.
+        with 1 the pairs are aligned in the current process
+    batch_size: number of pairs sent to a worker at a time
+    fast: align with the trimmed, banded fast path (see align_pair_fast)
+    protein: compare protein sequences (see align_pair_protein)
+
+returns:
+    generator of the cigar strings, in the same order as pairs
+"""
+def align_pairs(pairs, processes=None, batch_size=16, fast=False, protein=False):
+    processes = processes or os.cpu_count() or 1
+    start = time.perf_counter()
+    count = 0
+    if processes == 1:
+        for batch in batches(pairs, batch_size):
+            for cigar in align_batch(batch, fast, protein):
+                count += 1
+                yield cigar
+    else:
+        with ProcessPoolExecutor(processes, initializer=init_worker) as executor:
+            for cigars in executor.map(partial(align_batch, fast=fast, protein=protein), batches(pairs, batch_size)):
+                for cigar in cigars:
+                    count += 1
+                    yield cigar
+    elapsed = time.perf_counter() - start
+    if count:
+        print(f'aligned {count} alleles in {elapsed:.2f}s ({count / max(elapsed, 1e-9):.1f} alignments/sec)')
+
+
+"""
+parameters:
+    seq1: first sequence
+    seq2: second sequence
+
+returns:
+    the cigar string
+"""
+def generate_cigar(seq1, seq2):
+    cigar = []
+    count = 0
+    operation = ''
+
+    for i in range(len(seq1)):
+        if seq1[i] == seq2[i]:
+            if operation == 'M':
+                count += 1
+            else:
+                if count > 0:
+                    cigar.append(f"{count}{operation}")
+                operation = 'M'
+                count = 1
+        elif seq1[i] == '-':
+            if operation == 'I':
+                count += 1
+            else:
+                if count > 0:
+                    cigar.append(f"{count}{operation}")
+                operation = 'I'
+                count = 1
+        elif seq2[i] == '-':
+            if operation == 'D':
+                count += 1
+            else:
+                if count > 0:
+                    cigar.append(f"{count}{operation}")
+                operation = 'D'
+                count = 1
+        else:
+            if operation == 'M':
+                count += 1
+            else:
+                if count > 0:
+                    cigar.append(f"{count}{operation}")
+                operation = 'M'
+                count = 1
+
+    if count > 0:
+        cigar.append(f"{count}{operation}")
+
+    return ''.join(cigar)
\ No newline at end of file
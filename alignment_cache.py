@@ -0,0 +1,81 @@
+import sqlite3
+import time
+
+
+"""
+on-disk cache of cigar strings, keyed by the digests of the two aligned
+sequences and the parameters of the aligner. once the cache holds more than
+max_entries results, the least recently used ones are removed
+
+parameters:
+    path: the sqlite file to store the cache in
+    max_entries: maximum number of cigar strings kept in the cache
+"""
+class AlignmentCache:
+    def __init__(self, path, max_entries=500000):
+        self.path = path
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS cigars ('
+            'new_digest TEXT, old_digest TEXT, parameters TEXT, cigar TEXT, last_used REAL, '
+            'PRIMARY KEY (new_digest, old_digest, parameters))')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS cigars_last_used ON cigars (last_used)')
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM cigars').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    """
+    parameters:
+        keys: list of (new digest, old digest) pairs
+        parameters: key describing the aligner (see align_alleles.aligner_parameters)
+
+    returns:
+        a dictionary of the form {(new digest, old digest): cigar} for the keys
+        that are in the cache
+    """
+    def get_many(self, keys, parameters):
+        found = {}
+        now = time.time()
+        with self.connection:
+            for new_digest, old_digest in keys:
+                row = self.connection.execute(
+                    'SELECT cigar FROM cigars WHERE new_digest = ? AND old_digest = ? AND parameters = ?',
+                    (new_digest, old_digest, parameters)).fetchone()
+                if row is not None:
+                    found[(new_digest, old_digest)] = row[0]
+            self.connection.executemany(
+                'UPDATE cigars SET last_used = ? WHERE new_digest = ? AND old_digest = ? AND parameters = ?',
+                [(now, new_digest, old_digest, parameters) for new_digest, old_digest in found])
+        return found
+
+    """
+    stores cigar strings in a single transaction, then removes the least
+    recently used results if the cache is too big
+
+    parameters:
+        results: dictionary of the form {(new digest, old digest): cigar}
+        parameters: key describing the aligner (see align_alleles.aligner_parameters)
+    """
+    def put_many(self, results, parameters):
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO cigars VALUES (?, ?, ?, ?, ?)',
+                [(new_digest, old_digest, parameters, cigar, now)
+                 for (new_digest, old_digest), cigar in results.items()])
+            extra = len(self) - self.max_entries
+            if extra > 0:
+                self.connection.execute(
+                    'DELETE FROM cigars WHERE rowid IN '
+                    '(SELECT rowid FROM cigars ORDER BY last_used, rowid LIMIT ?)', (extra,))
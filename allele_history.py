@@ -0,0 +1,81 @@
+import sqlite3
+
+from create_report import allele_dict, modified_cigars, release_diff
+from nomenclature import version_key
+from report_db import file_type
+
+
+"""
+builds the history of every allele across many IMGT releases. every release
+is read once, and each release is compared with the one before it. the
+history is stored in a sqlite file with one row per event:
+    allele, release, status, cigar
+where status is 'New' (first release the allele is seen in, or added back
+after being deleted), 'Modified' (with the cigar of the change) or 'Deleted'
+
+parameters:
+    releases: list of (version, fasta file) pairs, i.e. [('3.55', 'hla_gen_3550.fasta')]
+    output_file: the sqlite file to write to
+    processes: number of alignment processes, defaults to the number of cpus
+    fast: use the trimmed, banded fast path for alignments
+    cache: sqlite file used to cache alignment results between runs
+"""
+def build_history(releases, output_file, processes=None, fast=False, cache=None):
+    releases = sorted(releases, key=lambda release: version_key(release[0]))
+    connection = sqlite3.connect(output_file)
+    with connection:
+        connection.execute('DROP TABLE IF EXISTS releases')
+        connection.execute('DROP TABLE IF EXISTS events')
+        connection.execute('CREATE TABLE releases (position INTEGER PRIMARY KEY, version TEXT)')
+        connection.execute('CREATE TABLE events (allele TEXT, position INTEGER, status TEXT, cigar TEXT)')
+    previous = None
+    for position, (version, file) in enumerate(releases):
+        current = allele_dict(file)
+        if previous is None:
+            new, deleted, modified, cigars = sorted(current.keys()), [], [], {}
+        else:
+            new, deleted, _, modified = release_diff(current, previous)
+            cigars = modified_cigars(current, previous, modified, processes, fast, cache, file_type(file) == 'prot')
+            previous.close()
+        with connection:
+            connection.execute('INSERT INTO releases VALUES (?, ?)', (position, version))
+            connection.executemany('INSERT INTO events VALUES (?, ?, ?, ?)',
+                                   [(allele, position, 'New', None) for allele in new])
+            connection.executemany('INSERT INTO events VALUES (?, ?, ?, ?)',
+                                   [(allele, position, 'Deleted', None) for allele in deleted])
+            connection.executemany('INSERT INTO events VALUES (?, ?, ?, ?)',
+                                   [(allele, position, 'Modified', cigars[allele]) for allele in modified])
+        previous = current
+    if previous is not None:
+        previous.close()
+    with connection:
+        connection.execute('CREATE INDEX events_allele ON events (allele, position)')
+    connection.close()
+
+
+"""
+parameters:
+    history_file: sqlite file written by build_history
+    allele: the name of the allele
+    since: only return events from this release onwards, i.e. '3.40'
+
+returns:
+    list of (release, status, cigar) events of the allele, oldest first
+"""
+def allele_timeline(history_file, allele, since=None):
+    connection = sqlite3.connect(history_file)
+    first = 0
+    if since is not None:
+        positions = [position for position, version in connection.execute('SELECT position, version FROM releases')
+                     if version_key(version) >= version_key(since)]
+        if not positions:
+            connection.close()
+            return []
+        first = min(positions)
+    rows = connection.execute(
+        'SELECT releases.version, events.status, events.cigar FROM events '
+        'JOIN releases ON releases.position = events.position '
+        'WHERE events.allele = ? AND events.position >= ? ORDER BY events.position',
+        (allele, first)).fetchall()
+    connection.close()
+    return rows
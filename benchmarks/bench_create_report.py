@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from multiprocessing import Process, Queue
+from queue import Empty
+
+# Adjust the path to include the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Bio import Align
+
+from align_alleles import alignment_cigar, generate_cigar
+from create_report import allele_comparison, allele_dict, release_diff
+
+# (min, max) length of the sequences of every file type
+LENGTHS = {'gen': (2800, 3600), 'nuc': (1000, 1150), 'prot': (340, 370)}
+ALPHABETS = {'gen': 'ACGT', 'nuc': 'ACGT', 'prot': 'ACDEFGHIKLMNPQRSTVWY'}
+
+
+"""
+parameters:
+    count: number of names
+    rng: random.Random used to pick the names
+
+returns:
+    sorted list of unique allele names, i.e. A*01:01:01:01 or A*02:101:03N
+"""
+def allele_names(count, rng):
+    names = set()
+    while len(names) < count:
+        fields = [rng.randint(1, 80), rng.choices([rng.randint(1, 20), rng.randint(1, 400)], [4, 1])[0]]
+        for _ in range(rng.choice((0, 1, 1, 2))):
+            fields.append(rng.randint(1, 12))
+        suffix = 'N' if rng.random() < 0.03 else ''
+        names.add('A*' + ':'.join(f'{field:02d}' for field in fields) + suffix)
+    return sorted(names)
+
+
+"""
+parameters:
+    sequence: the sequence to change
+    alphabet: the characters of the sequence
+    rng: random.Random used to pick the changes
+
+returns:
+    the sequence with a few substitutions, insertions, deletions or an
+    extension at one end, like the changes between two IMGT releases
+"""
+def mutate(sequence, alphabet, rng):
+    for _ in range(rng.randint(1, 3)):
+        position = rng.randrange(len(sequence))
+        change = rng.random()
+        if change < 0.5:
+            sequence = sequence[:position] + rng.choice(alphabet) + sequence[position + 1:]
+        elif change < 0.7:
+            sequence = sequence[:position] + ''.join(rng.choices(alphabet, k=rng.randint(1, 12))) + sequence[position:]
+        elif change < 0.9:
+            sequence = sequence[:position] + sequence[position + rng.randint(1, 12):]
+        else:
+            sequence = ''.join(rng.choices(alphabet, k=rng.randint(5, 60))) + sequence
+    return sequence
+
+
+"""
+writes a fasta file in the IMGT format (60 bases per line)
+
+parameters:
+    file: the file to write to
+    release: dictionary of the form {allele: sequence}
+"""
+def write_fasta(file, release):
+    with open(file, 'w') as f:
+        for number, (allele, sequence) in enumerate(release.items()):
+            f.write(f'>HLA:HLA{number:05d} {allele} {len(sequence)} bp\n')
+            for start in range(0, len(sequence), 60):
+                f.write(sequence[start:start + 60] + '\n')
+
+
+"""
+writes two synthetic releases. the alleles of the new release are the alleles
+of the old one, minus the deleted ones and plus the new ones, and a fraction
+of the remaining alleles is modified
+
+parameters:
+    directory: the directory to write new_<kind>.fasta and old_<kind>.fasta to
+    count: number of alleles in the old release
+    kind: 'gen', 'nuc' or 'prot'
+    new, deleted, modified: fraction of alleles that are new, deleted or modified
+    seed: seed of the random generator
+
+returns:
+    the paths of the new and old release
+"""
+def synthetic_releases(directory, count, kind='nuc', new=0.02, deleted=0.01, modified=0.05, seed=0):
+    rng = random.Random(seed)
+    alphabet = ALPHABETS[kind]
+    low, high = LENGTHS[kind]
+    names = allele_names(count + int(count * new), rng)
+    new_names = set(rng.sample(names, int(count * new)))
+    ancestors = [''.join(rng.choices(alphabet, k=rng.randint(low, high))) for _ in range(20)]
+    old_release = {}
+    for name in names:
+        if name not in new_names:
+            old_release[name] = mutate(rng.choice(ancestors), alphabet, rng)
+    new_release = {}
+    for name, sequence in old_release.items():
+        change = rng.random()
+        if change < deleted:
+            continue
+        if change < deleted + modified:
+            sequence = mutate(sequence, alphabet, rng)
+        new_release[name] = sequence
+    for name in sorted(new_names):
+        new_release[name] = mutate(rng.choice(ancestors), alphabet, rng)
+    new_file = os.path.join(directory, f'new_{kind}.fasta')
+    old_file = os.path.join(directory, f'old_{kind}.fasta')
+    write_fasta(new_file, dict(sorted(new_release.items())))
+    write_fasta(old_file, old_release)
+    return new_file, old_file
+
+
+"""
+returns:
+    the peak resident set size of the current process in MB
+"""
+def peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+
+"""
+runs every stage for one release size and puts the timings (or the error,
+if a stage fails) on the queue. runs in its own process so that the peak RSS
+only counts this size
+
+parameters:
+    count: number of alleles
+    kind: 'gen', 'nuc' or 'prot'
+    processes: number of alignment processes
+    fast: use the trimmed, banded fast path
+    queue: multiprocessing.Queue the result is put on
+"""
+def run_size(count, kind, processes, fast, queue):
+    try:
+        queue.put(measure_size(count, kind, processes, fast))
+    except BaseException:
+        queue.put({'alleles': count, 'type': kind, 'error': traceback.format_exc()})
+        raise
+
+
+"""
+runs every stage for one release size
+
+parameters:
+    count: number of alleles
+    kind: 'gen', 'nuc' or 'prot'
+    processes: number of alignment processes
+    fast: use the trimmed, banded fast path
+
+returns:
+    the counts of the synthetic releases and the time and peak RSS of every stage
+"""
+def measure_size(count, kind, processes, fast):
+    stages = {}
+
+    def record(stage, start):
+        stages[stage] = {'seconds': round(time.perf_counter() - start, 4), 'peak_rss_mb': peak_rss()}
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        new_file, old_file = synthetic_releases(directory, count, kind)
+        record('write_releases', start)
+
+        start = time.perf_counter()
+        new_release, old_release = allele_dict(new_file), allele_dict(old_file)
+        record('allele_dict', start)
+
+        start = time.perf_counter()
+        allele_dict(new_file).close()
+        allele_dict(old_file).close()
+        record('allele_dict_indexed', start)
+
+        start = time.perf_counter()
+        new, deleted, unchanged, modified = release_diff(new_release, old_release)
+        record('release_diff', start)
+
+        start = time.perf_counter()
+        allele_comparison(new_file, old_file, os.path.join(directory, 'report.txt'), processes, fast)
+        record('allele_comparison', start)
+
+        aligner = Align.PairwiseAligner()
+        alignments = [aligner.align(new_release[allele], old_release[allele])[0] for allele in modified[:200]]
+        start = time.perf_counter()
+        for alignment in alignments:
+            sequences = format(alignment, 'fasta').split('\n')
+            generate_cigar(sequences[3], sequences[1])
+        record('generate_cigar', start)
+
+        start = time.perf_counter()
+        for alignment in alignments:
+            alignment_cigar(alignment)
+        record('alignment_cigar', start)
+
+        new_release.close()
+        old_release.close()
+    return {'alleles': count, 'type': kind, 'new': len(new), 'deleted': len(deleted),
+            'unchanged': len(unchanged), 'modified': len(modified), 'stages': stages}
+
+
+"""
+runs the benchmark for every size and writes the results as json
+
+parameters:
+    sizes: numbers of alleles to benchmark
+    kind: 'gen', 'nuc' or 'prot'
+    output_file: the json file to write to
+    processes: number of alignment processes
+    fast: use the trimmed, banded fast path
+
+returns:
+    the results, with an 'error' instead of the stages for sizes that failed
+"""
+def main(sizes=(1000, 10000, 50000), kind='nuc', output_file='bench_output.json', processes=None, fast=False):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    results = {'commit': commit, 'python': sys.version.split()[0], 'processes': processes,
+               'fast': fast, 'runs': []}
+    for count in sizes:
+        queue = Queue()
+        process = Process(target=run_size, args=(count, kind, processes, fast, queue))
+        process.start()
+        result = None
+        while result is None:
+            try:
+                result = queue.get(timeout=1)
+            except Empty:
+                if not process.is_alive() and queue.empty():
+                    result = {'alleles': count, 'type': kind,
+                              'error': f'benchmark process exited with code {process.exitcode}'}
+        process.join()
+        results['runs'].append(result)
+        if 'error' in result:
+            print(f'{count} alleles failed:\n{result["error"]}', file=sys.stderr)
+        else:
+            print(json.dumps(result))
+    with open(output_file, 'w') as f:
+        json.dump(results, f, indent=4)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark create_report on synthetic IMGT releases')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--type', choices=sorted(LENGTHS), default='nuc')
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--fast', action='store_true')
+    args = parser.parse_args()
+    main(args.sizes, args.type, args.output, args.processes, args.fast)
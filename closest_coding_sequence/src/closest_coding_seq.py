@@ -1,38 +1,201 @@
+from bisect import bisect_left
+
+import numpy as np
+
+from nomenclature import format_allele, parse_allele
+
 """
 parameters:
     name: the name of the sequence
     data: dict containing name, sequence pairs
+    completeness: CompletenessTable of data, used instead of scanning the sequences for '*'
+    index: AlleleIndex of data, built from data the first time it is needed if not given
 
 returns:
     the next closest complete sequence
 """
-def find_closest_coding_seq(allele_name: str, allele_data: dict[str, str]) -> dict[str, str]:
-    sequence = allele_data[allele_name]
-    while ('*' in sequence):
-        allele_name = update_name(allele_name, allele_data)
-        sequence = allele_data[allele_name]
-    return {allele_name: sequence}
+def find_closest_coding_seq(allele_name: str, allele_data: dict[str, str],
+                            completeness: 'CompletenessTable | None' = None,
+                            index: 'AlleleIndex | None' = None) -> dict[str, str]:
+    while not (completeness.is_complete(allele_name) if completeness is not None
+               else '*' not in allele_data[allele_name]):
+        if index is None:
+            index = AlleleIndex(allele_data)
+        allele_name = update_name(allele_name, allele_data, index)
+    return {allele_name: allele_data[allele_name]}
+
+"""
+finds the closest complete sequence of every allele in one pass. alleles are
+visited in sorted order, and every allele on a chain of update_name steps is
+mapped to the end of the chain, so no chain is walked twice (like path
+compression in union-find)
+
+parameters:
+    allele_data: dict containing name, sequence pairs
+    index: AlleleIndex of allele_data, built from allele_data if not given
+    completeness: CompletenessTable of allele_data, built from allele_data if not given
+
+returns:
+    dict of the form {allele: name of the closest complete allele}, with None
+    for alleles that have no complete allele before them
+"""
+def resolve_all(allele_data: dict[str, str], index: 'AlleleIndex | None' = None,
+                completeness: 'CompletenessTable | None' = None) -> dict[str, 'str | None']:
+    if index is None:
+        index = AlleleIndex(allele_data)
+    if completeness is None:
+        completeness = CompletenessTable(allele_data, index)
+    resolved = {}
+    for allele in index.names:
+        path = []
+        name = allele
+        while name not in resolved:
+            if completeness.is_complete(name):
+                resolved[name] = name
+                break
+            path.append(name)
+            try:
+                name = update_name(name, allele_data, index)
+            except (KeyError, ValueError):
+                name = None
+                break
+        target = resolved[name] if name is not None else None
+        for step in path:
+            resolved[step] = target
+    return resolved
 
 """
 parameters:
     name: the name of the allele
     data: dict containing name, sequence pairs
+    index: AlleleIndex of data, built from data if not given
 
 returns:
     the next closest name
 """
-def update_name(name: str, data: dict[str, str]) -> str:
+def update_name(name: str, data: dict[str, str], index: 'AlleleIndex | None' = None) -> str:
     if not name[-1].isdigit():
         name = name[:-1]
     while name[-3:] == ":01":
         name = name[:-3]
     name = decrement_field(name)
-    if name not in data.keys():
-        filtered_keys = sorted({key for key in set(data.keys()) if key.startswith(name)})
-        name = filtered_keys.pop()
+    if name not in data:
+        if index is None:
+            index = AlleleIndex(data)
+        closest = index.floor(name)
+        if closest is None:
+            raise KeyError(name)
+        name = closest
     return name
 
 
+"""
+allele names sorted by locus and nomenclature fields, used to find the
+closest allele to a name that is not in the data by bisection
+
+parameters:
+    alleles: the allele names (i.e. the keys of the allele data)
+"""
+class AlleleIndex:
+    def __init__(self, alleles):
+        entries = sorted((parse_allele(allele).sort_key, allele) for allele in alleles)
+        self.keys = [(key[0], key[1]) for key, _ in entries]
+        self.names = [allele for _, allele in entries]
+
+    def __len__(self):
+        return len(self.names)
+
+    """
+    parameters:
+        name: the name of an allele, that does not need to be in the index
+
+    returns:
+        the greatest allele at or below the name (an allele with the same
+        fields, or the greatest one that has more fields starting with them)
+        that has the same fields as the name except for the last one, or None
+        if there is none. i.e. A*02:05 -> A*02:05:06, A*02:06:09 -> A*02:06:09N
+    """
+    def floor(self, name: str) -> 'str | None':
+        allele = parse_allele(name)
+        parent = allele.fields[:-1]
+        position = bisect_left(self.keys, (allele.locus, parent + (allele.fields[-1] + 1,))) - 1
+        if position < 0:
+            return None
+        locus, fields = self.keys[position]
+        if locus != allele.locus or len(fields) <= len(parent) or fields[:len(parent)] != parent:
+            return None
+        return self.names[position]
+
+
+"""
+completeness of every allele of a release, built in one vectorized pass over
+all the sequences: a flag that is True if the sequence has no '*' (unknown
+base), and the offsets of the first and last known bases. the sequences are
+scanned in batches, so memory does not grow with the release. rows are in the
+order of the AlleleIndex (or of the data when no index is given)
+
+parameters:
+    allele_data: dict containing name, sequence pairs
+    index: AlleleIndex of allele_data
+    batch_size: number of sequences scanned at a time
+"""
+class CompletenessTable:
+    def __init__(self, allele_data, index=None, batch_size=1024):
+        self.names = list(index.names) if index is not None else list(allele_data)
+        self.rows = {name: row for row, name in enumerate(self.names)}
+        self.complete = np.zeros(len(self.names), dtype=bool)
+        self.first = np.full(len(self.names), -1, dtype=np.int64)
+        self.last = np.full(len(self.names), -1, dtype=np.int64)
+        for batch in range(0, len(self.names), batch_size):
+            sequences = [str(allele_data[name]).encode() for name in self.names[batch:batch + batch_size]]
+            self._scan(batch, sequences)
+
+    """
+    fills the rows of a batch of sequences, using the positions of the '*'
+    of all the sequences joined together
+
+    parameters:
+        batch: row of the first sequence
+        sequences: the sequences (bytes) of the batch
+    """
+    def _scan(self, batch, sequences):
+        lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+        starts = np.cumsum(lengths) - lengths
+        stars = np.flatnonzero(np.frombuffer(b''.join(sequences), dtype=np.uint8) == ord('*'))
+        rows = np.searchsorted(starts, stars, side='right') - 1
+        counts = np.bincount(rows, minlength=len(sequences))
+        rank = np.arange(len(stars)) - np.searchsorted(rows, rows)
+        leading = np.bincount(rows[stars - starts[rows] == rank], minlength=len(sequences))
+        trailing = np.bincount(rows[starts[rows] + lengths[rows] - 1 - stars == counts[rows] - 1 - rank],
+                               minlength=len(sequences))
+        has_known = counts < lengths
+        end = batch + len(sequences)
+        self.complete[batch:end] = counts == 0
+        self.first[batch:end] = np.where(has_known, leading, -1)
+        self.last[batch:end] = np.where(has_known, lengths - 1 - trailing, -1)
+
+    def __len__(self):
+        return len(self.names)
+
+    """
+    returns:
+        True if the sequence of the allele has no '*'
+    """
+    def is_complete(self, allele: str) -> bool:
+        return bool(self.complete[self.rows[allele]])
+
+    """
+    returns:
+        (first, last) offsets of the known bases of the allele (the sequence
+        without its leading and trailing '*'), or None if no base is known
+    """
+    def known_span(self, allele: str) -> 'tuple[int, int] | None':
+        row = self.rows[allele]
+        if self.first[row] < 0:
+            return None
+        return int(self.first[row]), int(self.last[row])
+
+
 """
 parameters:
     name: the name of the allele
@@ -41,10 +204,5 @@ returns:
     str: name with last field decremented by 1
 """
 def decrement_field(name: str) -> str:
-    index = max(name.rfind(':'), name.rfind('*'))
-    num = int(name[(index + 1):])
-    num_digits = max(2,len(str(num)))
-    if num <= 10:
-        return name[:-num_digits] + str(f'0{num - 1}')
-    else:
-        return name[:-num_digits] + str(f'{num - 1}')
+    allele = parse_allele(name)
+    return format_allele(allele.locus, allele.fields[:-1] + (allele.fields[-1] - 1,))
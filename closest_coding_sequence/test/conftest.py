@@ -1,5 +1,11 @@
+import os
+import sys
+
 import pytest
 
+# Adjust the path to include the repository root, for nomenclature.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
 @pytest.fixture
 def allele_data1():
     return{
@@ -1,5 +1,5 @@
 import pytest
-from src.closest_coding_seq import find_closest_coding_seq, update_name, decrement_field
+from src.closest_coding_seq import find_closest_coding_seq, update_name, decrement_field, AlleleIndex, resolve_all, CompletenessTable
 
 
 # test cases
@@ -35,4 +35,66 @@ def test_update_name(allele_data1, allele_data2, allele_data3):
     assert update_name('A*02:06:15', allele_data2) == "A*02:06:14N"
     assert update_name('A*02:06:14N', allele_data2) == "A*02:06:13"
     assert update_name('A*02:06:02', allele_data3) == 'A*02:06:01:03'
-    assert update_name('A*02:06:01:01', allele_data3) == 'A*02:05:06'
\ No newline at end of file
+    assert update_name('A*02:06:01:01', allele_data3) == 'A*02:05:06'
+
+
+# tests for the allele index
+def test_allele_index(allele_data1, allele_data2, allele_data3):
+    index = AlleleIndex(allele_data3)
+    assert len(index) == len(allele_data3)
+    assert index.floor('A*02:05') == 'A*02:05:06'
+    assert index.floor('A*02:06:01') == 'A*02:06:01:03'
+    assert index.floor('A*02:06:10') == 'A*02:06:05'
+    assert index.floor('A*01') == 'A*01:03:01'
+    assert index.floor('A*02:00') is None
+    assert index.floor('B*02:05') is None
+    assert AlleleIndex(allele_data1).floor('A*02:07:200') == 'A*02:07:107'
+    assert AlleleIndex(allele_data2).floor('A*02:06:09') == 'A*02:06:09N'
+    assert update_name('A*02:07:100', allele_data1, AlleleIndex(allele_data1)) == 'A*02:07:99'
+
+
+# tests for resolving every allele at once
+def test_resolve_all(allele_data1, allele_data2, allele_data3, allele_data4):
+    for allele_data in (allele_data1, allele_data2, allele_data3):
+        resolved = resolve_all(allele_data)
+        assert resolved.keys() == allele_data.keys()
+        for allele, target in resolved.items():
+            if target is None:
+                with pytest.raises(KeyError):
+                    find_closest_coding_seq(allele, allele_data)
+            else:
+                assert {target: allele_data[target]} == find_closest_coding_seq(allele, allele_data)
+    assert resolve_all(allele_data3)['A*02:06:01:01'] == 'A*02:05:04'
+    assert resolve_all(allele_data4) == {allele: None for allele in allele_data4}
+
+
+# tests for the completeness table
+def test_completeness_table(allele_data1, allele_data2, allele_data3, allele_data4, allele_name, expected):
+    for allele_data in (allele_data1, allele_data2, allele_data3, allele_data4):
+        table = CompletenessTable(allele_data, AlleleIndex(allele_data), batch_size=3)
+        assert len(table) == len(allele_data)
+        for allele, sequence in allele_data.items():
+            assert table.is_complete(allele) == ('*' not in sequence)
+            known = sequence.strip('*')
+            if known:
+                first = len(sequence) - len(sequence.lstrip('*'))
+                assert table.known_span(allele) == (first, first + len(known) - 1)
+            else:
+                assert table.known_span(allele) is None
+    assert CompletenessTable({}).names == []
+    completeness = CompletenessTable(allele_data3)
+    assert find_closest_coding_seq(allele_name[4], allele_data3, completeness) == expected[4]
+    assert find_closest_coding_seq(allele_name[5], allele_data3, completeness) == expected[5]
+
+
+# tests for passing a prebuilt index to find_closest_coding_seq
+def test_find_with_index(monkeypatch, allele_name, allele_data3, expected):
+    index = AlleleIndex(allele_data3)
+    completeness = CompletenessTable(allele_data3, index)
+
+    def rebuild(allele_data):
+        raise AssertionError('index was rebuilt')
+
+    monkeypatch.setattr('src.closest_coding_seq.AlleleIndex', rebuild)
+    assert find_closest_coding_seq(allele_name[4], allele_data3, index=index) == expected[4]
+    assert find_closest_coding_seq(allele_name[5], allele_data3, completeness, index) == expected[5]
@@ -1,5 +1,117 @@
-from networkx import intersection
 import json
+import os
+import sys
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+
+from nomenclature import parse_allele, version_key
+from report_db import allele_locus, is_report_db, read_statuses
+
+
+"""
+status of an allele in a report
+"""
+class Status(Enum):
+    NEW = 'New'
+    MODIFIED = 'Modified'
+    DELETED = 'Deleted'
+
+
+_STATUSES = {status.value: status for status in Status}
+
+
+"""
+index of one or more reports, parsed once. every line is split on commas
+only once; lines that do not start with a status (the IMGT '#' header, the
+'Status,Alleles,...' column names, the cigar lines of our reports) are
+skipped. allele names are interned so that the indexes of the gen, nuc and
+IMGT reports share their keys. when more than one report is given, later
+reports override earlier ones, like gen_dict | nuc_dict
+
+parameters:
+    files: the reports to read (text reports, IMGT version reports or sqlite
+           reports from report_db.py)
+"""
+class ReportIndex:
+    def __init__(self, *files):
+        self.statuses = {}
+        self.version = None
+        self.date = None
+        for file in files:
+            self._read(file)
+
+    def _read(self, file):
+        statuses = self.statuses
+        if is_report_db(file):
+            for allele, labels in read_statuses(file).items():
+                statuses[sys.intern(allele)] = tuple(_STATUSES[label] for label in labels)
+            return
+        with open(file, 'r') as f:
+            lines = f.read().splitlines()
+        for line in lines:
+            if line.startswith('#'):
+                key, _, value = line[1:].partition(':')
+                key = key.strip()
+                if key == 'version':
+                    self.version = value.split()[-1] if value.split() else None
+                elif key == 'date':
+                    self.date = value.strip()
+                continue
+            fields = line.split(',', 2)
+            status = _STATUSES.get(fields[0])
+            if status is not None and len(fields) > 1:
+                statuses[sys.intern(fields[1])] = (status,)
+
+    def __len__(self):
+        return len(self.statuses)
+
+    def __contains__(self, allele):
+        return allele in self.statuses
+
+    def __getitem__(self, allele):
+        return self.statuses[allele]
+
+    def __iter__(self):
+        return iter(self.statuses)
+
+    def keys(self):
+        return self.statuses.keys()
+
+    """
+    parameters:
+        allele: the name of the allele
+
+    returns:
+        the statuses of the allele as strings, i.e. ['New']
+    """
+    def labels(self, allele):
+        return [status.value for status in self.statuses[allele]]
+
+    """
+    returns:
+        a dictionary of the form {allele: ['New', 'Modified', 'Deleted']}
+    """
+    def as_dict(self):
+        return {allele: [status.value for status in statuses] for allele, statuses in self.statuses.items()}
+
+    """
+    parameters:
+        other: ReportIndex to compare with, i.e. of the imgt version report
+
+    returns:
+        matches: keys that are in both indexes with the same statuses
+        key_mismatch: keys that are in both indexes but have different statuses
+        missing_other: keys that are only in this index
+        missing_self: keys that are only in the other index
+    """
+    def compare(self, other):
+        mine = self.statuses
+        theirs = other.statuses
+        common = mine.keys() & theirs.keys()
+        matches = {key for key in common if mine[key] == theirs[key]}
+        return matches, common - matches, mine.keys() - theirs.keys(), theirs.keys() - mine.keys()
+
 
 """
 compares the reports from gen + nuc files with the imgt version report
@@ -16,25 +128,7 @@ returns:
     missing_scisco_report: keys that are in imgt report but not in scisco
 """
 def compare_reports(gen_file, nuc_file, imgt_file):
-    gen_dict = create_dict(gen_file)
-    nuc_dict = create_dict(nuc_file)
-    scisco_dict = gen_dict | nuc_dict
-    imgt_dict = create_dict(imgt_file)
-    matches = set()
-    key_mismatch = set()
-    for key in (set(scisco_dict.keys()) & set(imgt_dict.keys())):
-        if scisco_dict[key] == imgt_dict[key]:
-            matches.add(key)
-        else:
-            key_mismatch.add(key)
-    missing_imgt_report = set() # key in scisco report but not in imgt
-    for key in (set(scisco_dict.keys()) - set(imgt_dict.keys())):
-        missing_imgt_report.add(key)
-
-    missing_scisco_report = set() # key in imgt report but not in scisco
-    for key in (set(imgt_dict.keys()) - set(scisco_dict.keys())):
-        missing_scisco_report.add(key)
-    return matches, key_mismatch, missing_imgt_report, missing_scisco_report
+    return ReportIndex(gen_file, nuc_file).compare(ReportIndex(imgt_file))
     
 
 """
@@ -42,33 +136,91 @@ creates a dictionary from the report file
 keys are allele names, values are: 'New', 'Modified', 'Deleted'
 
 parameters:
-    file: the file to read from
+    file: the file to read from (text report, or sqlite report from report_db.py)
 
 returns:
     a dictionary of the form {allele: ['New', 'Modified', 'Deleted']}
 """
 def create_dict(file):
-    with open(file, 'r') as f:
-        line = f.readline()
-        dict = {}
-        while line:
-            if "New" not in line and "Modified" not in line and "Deleted" not in line:
-                pass
-            else:
-                name = ""
-                index = line.index(',') + 1
-                while line[index] != ',':
-                    name += line[index]
-                    index += 1
-                dict[name] = []
-                if "New" in line:
-                    dict[name].append("New")
-                if "Modified" in line:
-                    dict[name].append("Modified")
-                if "Deleted" in line:
-                    dict[name].append("Deleted")
-            line = f.readline()
-    return dict
+    return ReportIndex(file).as_dict()
+
+
+"""
+job run by backtest for a single release. counts the matches, mismatches and
+missing alleles of every locus
+
+parameters:
+    gen_report: gen report
+    nuc_report: nuc report
+    imgt_report: imgt version report
+
+returns:
+    the release (the version in the imgt report header, or the file name) and
+    a dictionary of the form {locus: [match, mismatch, missing_imgt, missing_scisco]}
+"""
+def backtest_release(gen_report, nuc_report, imgt_report):
+    imgt_index = ReportIndex(imgt_report)
+    results = ReportIndex(gen_report, nuc_report).compare(imgt_index)
+    counts = {}
+    for column, keys in enumerate(results):
+        for key in keys:
+            counts.setdefault(allele_locus(key), [0, 0, 0, 0])[column] += 1
+    return imgt_index.version or os.path.basename(imgt_report), counts
+
+
+"""
+parameters:
+    release: release from backtest_release, a version like 3.55.0 or a file name
+
+returns:
+    key that sorts versions by number (3.9.0 before 3.10.0) and file names
+    after them, by name
+"""
+def release_key(release):
+    try:
+        return (0, version_key(release), '')
+    except ValueError:
+        return (1, (), release)
+
+
+"""
+compares our reports with the imgt version reports of many releases, one job
+per release on a process pool, and writes a csv table with the match,
+mismatch and missing percentages of every release and every locus (the
+'All' rows are the totals of a release)
+
+parameters:
+    triples: list of (gen report, nuc report, imgt version report)
+    output_file: the csv file to write to
+    processes: number of releases compared at the same time, defaults to the number of cpus
+
+returns:
+    a dictionary of the form {release: {locus: [match, mismatch, missing_imgt, missing_scisco]}},
+    sorted by release version (releases named after their file come last)
+
+raises:
+    ValueError if two imgt reports are of the same release
+"""
+def backtest(triples, output_file, processes=None):
+    results = {}
+    with ProcessPoolExecutor(processes) as executor:
+        jobs = [executor.submit(backtest_release, *triple) for triple in triples]
+        for (_, _, imgt_report), job in zip(triples, jobs):
+            release, counts = job.result()
+            if release in results:
+                raise ValueError(f'{imgt_report} is a second report of release {release}')
+            results[release] = counts
+    results = {release: results[release] for release in sorted(results, key=release_key)}
+    with open(output_file, 'w') as f:
+        f.write('Release,Locus,Total,Match %,Mismatch %,Missing IMGT %,Missing Scisco %\n')
+        for release in results:
+            counts = results[release]
+            totals = [sum(column) for column in zip(*counts.values())] or [0, 0, 0, 0]
+            for locus, row in sorted(counts.items()) + [('All', totals)]:
+                total = sum(row)
+                percentages = [f'{100 * value / total:.2f}' if total else '' for value in row]
+                f.write(','.join([release, locus, str(total)] + percentages) + '\n')
+    return results
 
 
 """
@@ -82,12 +234,12 @@ parameters:
 returns:
     nothing"""
 def write_comparison(gen_report, nuc_report,imgt_report, output_file):
-    good, bad, missing_imgt, missing_scisco = compare_reports(gen_report, nuc_report, imgt_report)
+    scisco_index = ReportIndex(gen_report, nuc_report)
+    imgt_index = ReportIndex(imgt_report)
+    good, bad, missing_imgt, missing_scisco = scisco_index.compare(imgt_index)
     total_len = len(good) + len(bad) + len(missing_imgt) + len(missing_scisco)
-    gen_dict = create_dict(f'{gen_report}')
-    nuc_dict = create_dict(f'{nuc_report}')
-    scisco_dict = gen_dict | nuc_dict
-    imgt_dict = create_dict(f'{imgt_report}')
+    scisco_dict = scisco_index.as_dict()
+    imgt_dict = imgt_index.as_dict()
     with open (f'{output_file}', 'w') as f:
         f.write('correct: \n')
         f.write (f'{100 *(len(good) / total_len)} %\n')
@@ -115,6 +267,47 @@ def write_comparison(gen_report, nuc_report,imgt_report, output_file):
             f.write(f'{key}:\t\t{imgt_dict[key]}\n')
 
 
+"""
+parameters:
+    alleles: iterable of allele names
+
+returns:
+    sorted list of (locus, fields, allele) used by descendants
+"""
+def field_index(alleles):
+    index = []
+    for allele in alleles:
+        try:
+            parsed = parse_allele(allele)
+        except ValueError:
+            continue
+        index.append((parsed.locus, parsed.fields, allele))
+    index.sort()
+    return index
+
+
+"""
+finds the alleles whose fields start with all the fields of an allele and
+have more fields, i.e. A*03:01 -> A*03:01:01, A*03:01:02N but not A*03:010
+
+parameters:
+    index: sorted list from field_index
+    allele: the name of the allele
+
+returns:
+    list of the descendants of the allele, sorted by fields
+"""
+def descendants(index, allele):
+    try:
+        parsed = parse_allele(allele)
+    except ValueError:
+        return []
+    locus, prefix = parsed.locus, parsed.fields
+    first = bisect_left(index, (locus, prefix))
+    last = bisect_left(index, (locus, prefix[:-1] + (prefix[-1] + 1,)))
+    return [other for _, _, other in index[first:last] if parse_allele(other).descends_from(parsed)]
+
+
 """
 parses through deleted values in the missing set and scisco dictionary.
 used to find alleles that have been split into two or more alleles
@@ -122,13 +315,10 @@ i.e. A:3:01 -> A:3:01:01, A:3:01:02
 """
 def parse_deleted(missing_set, scisco_dict):
     output = {}
+    index = None
     for key in missing_set:
         if scisco_dict[key] == ['Deleted']:
-            output[key] = []
-            deleted_key = key
-            if key[len(key) - 1] == "N":
-                deleted_key = key[:-1]
-            for allele in scisco_dict.keys():
-                if deleted_key != allele and deleted_key in allele:
-                    output[key].append(allele)
+            if index is None:
+                index = field_index(scisco_dict.keys())
+            output[key] = descendants(index, key)
     return output
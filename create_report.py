@@ -1,5 +1,18 @@
+import json
 import os
-from Bio import Align
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from align_alleles import align_pairs, aligner_parameters, generate_cigar
+from alignment_cache import AlignmentCache
+from fasta_index import IndexedFasta, sequence_digest
+from manifest import load_manifest, manifest_entry, same_entry
+from packed_sequence import PackedSequence
+from report_db import file_type, is_report_db, write_report
+
+
+# number of modified alleles aligned between two checkpoints
+CHECKPOINT_BATCH_SIZE = 500
 
 
 """
@@ -12,10 +25,10 @@ returns:
     directory_2_not_in_directory_1: files in dir2 that are not in dir1
 """
 def directory_diff(dir1, dir2):
-    files1 = os.listdir(dir1)
-    files2 = os.listdir(dir2)
-    directory1_not_in_directory2 = list(set(files1) - set(files2))
-    directory2_not_in_directory1 = list(set(files2) - set(files1))
+    files1 = load_manifest(dir1).keys()
+    files2 = load_manifest(dir2).keys()
+    directory1_not_in_directory2 = sorted(files1 - files2)
+    directory2_not_in_directory1 = sorted(files2 - files1)
     return (directory1_not_in_directory2, directory2_not_in_directory1)
 
 """
@@ -27,12 +40,13 @@ returns:
     the intersection of the two directories
 """
 def directory_intersection(dir1, dir2):
-    files1 = os.listdir(dir1)
-    files2 = os.listdir(dir2)
-    return list(sorted(set(files1)) & sorted(set(files2)))
+    return sorted(load_manifest(dir1).keys() & load_manifest(dir2).keys())
 
 
 """
+files of different sizes are never the same; otherwise only the two files
+are hashed (see manifest.manifest_entry)
+
 parameters:
     file1: first file
     file2: second file
@@ -41,18 +55,71 @@ returns:
     True if files are the same, False otherwise
 """
 def same_file(file1, file2):
-    with open(file1, 'r') as f1:
-        with open(file2, 'r') as f2:
-            line1 = f1.readline()
-            line2 = f2.readline()
-            while line1 and line2:
-                if line1 != line2:
-                    return False
-                line1 = f1.readline()
-                line2 = f2.readline()
-            if line1 or line2:
-                return False
-            return True
+    if os.path.getsize(file1) != os.path.getsize(file2):
+        return False
+    return manifest_entry(file1)['digest'] == manifest_entry(file2)['digest']
+
+
+"""
+compares every fasta file that is in both directories. files that are the
+same in both directories (according to the manifests, see manifest.py) are
+skipped, and the other files are compared with allele_comparison on a
+process pool (one job per file). writes one report per
+file (i.e. A_prot_report.txt) and a summary.csv with the counts and run time
+of every file
+
+parameters:
+    dir1: first directory (new release)
+    dir2: second directory (old release)
+    output_dir: the directory to write the reports to
+    processes: number of files compared at the same time, defaults to the number of cpus
+    fast: use the trimmed, banded fast path for alignments
+    cache: sqlite file used to cache alignment results between runs
+
+returns:
+    a dictionary of the form {file: (status, new, deleted, modified, seconds)}
+"""
+def compare_directories(dir1, dir2, output_dir, processes=None, fast=False, cache=None):
+    os.makedirs(output_dir, exist_ok=True)
+    manifest1 = load_manifest(dir1)
+    manifest2 = load_manifest(dir2)
+    summary = {}
+    for file in manifest1.keys() - manifest2.keys():
+        if file.endswith('.fasta'):
+            summary[file] = ('New', '', '', '', '')
+    for file in manifest2.keys() - manifest1.keys():
+        if file.endswith('.fasta'):
+            summary[file] = ('Deleted', '', '', '', '')
+    jobs = {}
+    with ProcessPoolExecutor(processes) as executor:
+        for file in sorted(manifest1.keys() & manifest2.keys()):
+            if not file.endswith('.fasta'):
+                continue
+            if same_entry(manifest1, manifest2, file):
+                summary[file] = ('Unchanged', 0, 0, 0, 0)
+                continue
+            report = os.path.join(output_dir, f'{file[:-len(".fasta")]}_report.txt')
+            jobs[file] = executor.submit(compare_file, os.path.join(dir1, file), os.path.join(dir2, file),
+                                         report, fast, cache)
+        for file, job in jobs.items():
+            summary[file] = ('Compared',) + job.result()
+    with open(os.path.join(output_dir, 'summary.csv'), 'w') as f:
+        f.write('File,Status,New,Deleted,Modified,Seconds\n')
+        for file in sorted(summary):
+            f.write(','.join(str(value) for value in (file,) + summary[file]) + '\n')
+    return summary
+
+
+"""
+job run by compare_directories for a single file
+
+returns:
+    the number of new, deleted and modified alleles, and the run time in seconds
+"""
+def compare_file(file1, file2, output_file, fast=False, cache=None):
+    start = time.perf_counter()
+    new, deleted, modified = allele_comparison(file1, file2, output_file, 1, fast, cache)
+    return new, deleted, modified, round(time.perf_counter() - start, 3)
 
 
 """
@@ -65,10 +132,9 @@ returns:
     alleles that are in file2 but not in file1    
 """
 def allele_diff(file1, file2):
-    dict1 = allele_dict(file1)
-    dict2 = allele_dict(file2)
-    output = (sorted(set(dict1.keys()) - set(dict2.keys()))), sorted((set(dict2.keys()) - set(dict1.keys())))
-    return output
+    with allele_dict(file1) as dict1, allele_dict(file2) as dict2:
+        new, deleted, _, _ = release_diff(dict1, dict2)
+    return new, deleted
 
 
 """
@@ -83,116 +149,235 @@ def allele_intersection(dict1, dict2):
     return sorted(set(dict1.keys()) & set(dict2.keys()))
 
 
+"""
+parameters:
+    release: dictionary of the form {allele: sequence}, as returned by allele_dict
+        or pack_release
+    allele: the name of the allele
+
+returns:
+    the digest of the allele's sequence
+"""
+def allele_digest(release, allele):
+    if isinstance(release, IndexedFasta):
+        return release.digest(allele)
+    sequence = release[allele]
+    if isinstance(sequence, PackedSequence):
+        return sequence.digest()
+    return sequence_digest(sequence)
+
+
+"""
+classifies every allele of two releases using the sequence digests stored in
+their indexes, so no sequence has to be read
+parameters:
+    dict1: first release (new release), as returned by allele_dict or pack_release
+    dict2: second release (old release), as returned by allele_dict or pack_release
+
+returns:
+    sorted lists of the new, deleted, unchanged and modified alleles
+"""
+def release_diff(dict1, dict2):
+    keys1 = dict1.keys()
+    keys2 = dict2.keys()
+    unchanged = []
+    modified = []
+    for allele in sorted(keys1 & keys2):
+        if allele_digest(dict1, allele) == allele_digest(dict2, allele):
+            unchanged.append(allele)
+        else:
+            modified.append(allele)
+    return sorted(keys1 - keys2), sorted(keys2 - keys1), unchanged, modified
+
+
 """
 prints every new allele and deleted allele in a text file.
 Compares the sequences of every allele that is in both files and 
-outputs the differences in there sequences into a text file
+outputs the differences in there sequences into a text file. only the
+sequences of modified alleles are read, and they are aligned on a process
+pool (see align_alleles.py)
 parameters:
     file1: first file (new file)
     file2: second file (old file)
+    output_file: the file to write to
+    processes: number of alignment processes, defaults to the number of cpus
+    fast: only align the part of each allele between the common prefix and
+        suffix, with a banded alignment
+    cache: sqlite file used to cache alignment results between runs (see
+        alignment_cache.py). only alleles that are not in the cache are aligned
+    checkpoint: save progress to output_file.ckpt after every batch of
+        modified alleles. if a checkpoint of the same comparison exists, the
+        run continues where the previous run stopped
+    batch_size: number of modified alleles aligned between checkpoints
+    stop_event: threading.Event, the run stops after the current batch once
+        it is set (i.e. from the GUI)
+    protein: compare the files as protein sequences (see
+        align_alleles.align_pair_protein). by default, *_prot files are
+        compared as proteins
 
 output:
-text file with differences between the two files
+text file with differences between the two files, or a sqlite report if
+output_file ends with .db or .sqlite (see report_db.py)
+
+returns:
+    the number of new, deleted and modified alleles, or None if the run was
+    stopped
 """
-def allele_comparison(file1, file2, output_file):
+def allele_comparison(file1, file2, output_file, processes=None, fast=False, cache=None,
+                      checkpoint=False, batch_size=CHECKPOINT_BATCH_SIZE, stop_event=None, protein=None):
     dict1 = allele_dict(file1)
     dict2 = allele_dict(file2)
-    with open(f'{output_file}', 'w') as f:
-        f.write("Results: \n")
-        for allele in allele_diff(file1, file2)[0]:
-            f.write("New," + str(allele) + ",\n")
-        for allele in allele_diff(file1, file2)[1]:
-            f.write("Deleted," + str(allele) + ",\n")
-        for allele in allele_intersection(dict1, dict2):
-            sequence1 = ""
-            for line in dict1[allele]:
-                sequence1 += line[:-1]
-            sequence2 = ""
-            for line in dict2[allele]:
-                sequence2 += line[:-1]
-            if hash(sequence1) != hash(sequence2):
-                f.write("Modified," + str(allele) + ",\n")
-                alignment = Align.PairwiseAligner().align(sequence1, sequence2)
-                sequences = format(alignment[0], 'fasta').split('\n')
-                sequence1 = sequences[1]
-                sequence2 = sequences[3]
-                f.write(f'{generate_cigar(sequence2, sequence1)}\n')
-                
-
-"""
-helper method to create dictionary of alleles and there sequences
+    try:
+        new, deleted, _, modified = release_diff(dict1, dict2)
+        kind = file_type(file1)
+        if protein is None:
+            protein = kind == 'prot'
+        inputs = checkpoint_inputs(file1, file2, fast, protein)
+        done = read_checkpoint(output_file, inputs) if checkpoint else None
+        if done is None:
+            done = 0
+            if is_report_db(output_file):
+                rows = [(allele, 'New', kind, None, allele_digest(dict1, allele), None) for allele in new]
+                rows += [(allele, 'Deleted', kind, None, None, allele_digest(dict2, allele)) for allele in deleted]
+                write_report(output_file, rows)
+            else:
+                with open(f'{output_file}', 'w') as f:
+                    f.write("Results: \n")
+                    for allele in new:
+                        f.write("New," + str(allele) + ",\n")
+                    for allele in deleted:
+                        f.write("Deleted," + str(allele) + ",\n")
+            if checkpoint:
+                write_checkpoint(output_file, inputs, done)
+        if not checkpoint:
+            batch_size = max(len(modified), 1)
+        for start in range(done, len(modified), batch_size):
+            if stop_event is not None and stop_event.is_set():
+                return None
+            batch = modified[start:start + batch_size]
+            cigars = modified_cigars(dict1, dict2, batch, processes, fast, cache, protein)
+            if is_report_db(output_file):
+                write_report(output_file, [(allele, 'Modified', kind, cigars[allele], allele_digest(dict1, allele),
+                                            allele_digest(dict2, allele)) for allele in batch], append=True)
+            else:
+                with open(f'{output_file}', 'a') as f:
+                    for allele in batch:
+                        f.write("Modified," + str(allele) + ",\n")
+                        f.write(f'{cigars[allele]}\n')
+                    if checkpoint:
+                        f.flush()
+                        os.fsync(f.fileno())
+            if checkpoint:
+                write_checkpoint(output_file, inputs, start + len(batch))
+        if checkpoint:
+            os.remove(f'{output_file}.ckpt')
+        return len(new), len(deleted), len(modified)
+    finally:
+        dict1.close()
+        dict2.close()
+
+
+"""
 parameters:
-    file: the file to read from
+    file1: first file (new file)
+    file2: second file (old file)
+    fast: whether the fast path is used
+    protein: whether the files are compared as proteins
 
 returns:
-    a dictionary of the form {allele: sequence}
+    description of the comparison, used to check that a checkpoint belongs to it
 """
-def allele_dict(file):
-    dict = {}
-    with open(file, 'r') as f:
-        line = f.readline()
-        while line:
-            if line[0] == '>':
-                name = ""
-                index = line.index(' ') + 1
-                while line[index] != ' ':
-                    name += line[index]
-                    index += 1
-                dict[name] = []
-            else:
-                dict[name].append(line)
-            line = f.readline()
-    return dict       
+def checkpoint_inputs(file1, file2, fast, protein=False):
+    stat1 = os.stat(file1)
+    stat2 = os.stat(file2)
+    return [os.path.abspath(file1), stat1.st_size, stat1.st_mtime_ns,
+            os.path.abspath(file2), stat2.st_size, stat2.st_mtime_ns, aligner_parameters(fast, protein)]
 
 
 """
+saves the number of modified alleles written to the report, and the size of
+the report (text reports only) in output_file.ckpt. the checkpoint is
+replaced atomically
+
 parameters:
-    seq1: first sequence
-    seq2: second sequence
+    output_file: the report being written
+    inputs: description of the comparison (see checkpoint_inputs)
+    done: number of modified alleles written
+"""
+def write_checkpoint(output_file, inputs, done):
+    offset = None if is_report_db(output_file) else os.path.getsize(output_file)
+    with open(f'{output_file}.ckpt.tmp', 'w') as f:
+        json.dump({'inputs': inputs, 'done': done, 'offset': offset}, f)
+    os.replace(f'{output_file}.ckpt.tmp', f'{output_file}.ckpt')
+
+
+"""
+parameters:
+    output_file: the report being written
+    inputs: description of the comparison (see checkpoint_inputs)
 
 returns:
-    the cigar string
+    the number of modified alleles already written, or None if there is no
+    checkpoint for this comparison. text reports are cut back to the size
+    they had at the checkpoint
 """
-def generate_cigar(seq1, seq2):
-    cigar = []
-    count = 0
-    operation = ''
+def read_checkpoint(output_file, inputs):
+    try:
+        with open(f'{output_file}.ckpt', 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state['inputs'] != inputs or not os.path.exists(output_file):
+        return None
+    if state['offset'] is not None:
+        if os.path.getsize(output_file) < state['offset']:
+            return None
+        os.truncate(output_file, state['offset'])
+    return state['done']
+
+
+"""
+aligns the new and old sequence of every modified allele
+parameters:
+    dict1: first release (new release), as returned by allele_dict or pack_release
+    dict2: second release (old release), as returned by allele_dict or pack_release
+    modified: the alleles to align
+    processes: number of alignment processes, defaults to the number of cpus
+    fast: use the trimmed, banded fast path
+    cache: sqlite file used to cache alignment results between runs
+    protein: compare the alleles as protein sequences
+
+returns:
+    a dictionary of the form {allele: cigar}
+"""
+def modified_cigars(dict1, dict2, modified, processes=None, fast=False, cache=None, protein=False):
+    keys = {allele: (allele_digest(dict1, allele), allele_digest(dict2, allele)) for allele in modified}
+    cached = {}
+    if cache is not None:
+        parameters = aligner_parameters(fast, protein)
+        cache = AlignmentCache(cache)
+        cached = cache.get_many(keys.values(), parameters)
+    missing = [allele for allele in modified if keys[allele] not in cached]
+    pairs = ((dict1[allele], dict2[allele]) for allele in missing)
+    cigars = dict(zip(missing, align_pairs(pairs, processes, fast=fast, protein=protein)))
+    if cache is not None:
+        cache.put_many({keys[allele]: cigar for allele, cigar in cigars.items()}, parameters)
+        cache.close()
+    for allele in modified:
+        if allele not in cigars:
+            cigars[allele] = cached[keys[allele]]
+    return cigars
 
-    for i in range(len(seq1)):
-        if seq1[i] == seq2[i]:
-            if operation == 'M':
-                count += 1
-            else:
-                if count > 0:
-                    cigar.append(f"{count}{operation}")
-                operation = 'M'
-                count = 1
-        elif seq1[i] == '-':
-            if operation == 'I':
-                count += 1
-            else:
-                if count > 0:
-                    cigar.append(f"{count}{operation}")
-                operation = 'I'
-                count = 1
-        elif seq2[i] == '-':
-            if operation == 'D':
-                count += 1
-            else:
-                if count > 0:
-                    cigar.append(f"{count}{operation}")
-                operation = 'D'
-                count = 1
-        else:
-            if operation == 'M':
-                count += 1
-            else:
-                if count > 0:
-                    cigar.append(f"{count}{operation}")
-                operation = 'M'
-                count = 1
 
-    if count > 0:
-        cigar.append(f"{count}{operation}")
+"""
+helper method to create dictionary of alleles and there sequences. the
+sequences are read from an indexed, memory mapped copy of the file when they
+are looked up (see fasta_index.py)
+parameters:
+    file: the file to read from
 
-    return ''.join(cigar)
\ No newline at end of file
+returns:
+    a dictionary of the form {allele: sequence}
+"""
+def allele_dict(file):
+    return IndexedFasta(file)
@@ -1,65 +1,183 @@
+import re
+from collections import namedtuple
+
+import numpy as np
+
+from align_alleles import match_runs
+from fasta_index import IndexedFasta
+from report_db import is_report_db, modified_alleles
+
+
 """
-prints the modification made to each allele in the report
+prints the modification made to each allele in the report. the report is read
+one line at a time, and only the parts of the sequences that are printed are
+fetched, so fasta files given as paths are never loaded into memory
 
 parameters:
-    old_dict: the dictionary of the old report
-    new_dict: the dictionary of the new report
-    report: the report to read from
+    old_dict: the old release (fasta file, IndexedFasta or dictionary of the form allele: sequence)
+    new_dict: the new release (fasta file, IndexedFasta or dictionary of the form allele: sequence)
+    report: the report to read from (text report, or sqlite report from report_db.py)
     output_file: the file to write to
 """
 
 def modification_log(old_dict, new_dict, report, output_file):
-    with open(report, 'r') as f:
+    old_release = IndexedFasta(old_dict) if isinstance(old_dict, str) else old_dict
+    new_release = IndexedFasta(new_dict) if isinstance(new_dict, str) else new_dict
+    try:
         with open(output_file, 'w') as o:
-            line = f.readline()
-            cigar_string = ''
-            while line:
-                if "Modified" in line:
-                    allele = line.split(',')[1]
-                    cigar_string = f.readline()
-                    o.write(f'>>> {allele}: \n')
-                    o.write(parse_cigar(allele, cigar_string, old_dict, new_dict)+'\n\n')
-                line = f.readline()
+            for allele, cigar_string in report_cigars(report):
+                o.write(f'>>> {allele}: \n')
+                o.write(parse_cigar(allele, cigar_string, old_release, new_release)+'\n\n')
+    finally:
+        if isinstance(old_dict, str):
+            old_release.close()
+        if isinstance(new_dict, str):
+            new_release.close()
+
 
 """
-goes through cigar string and prints the insertion and deletion indeces, aswell 
-as the bases added or removed
+parameters:
+    report: the report to read from (text report, or sqlite report from report_db.py)
+
+returns:
+    generator of the (allele, cigar) of every modified allele, read one line at a time
+"""
+def report_cigars(report):
+    if is_report_db(report):
+        for allele, cigar_string in modified_alleles(report):
+            yield allele, cigar_string + '\n'
+        return
+    with open(report, 'r') as f:
+        for line in f:
+            if line.startswith('Modified,'):
+                yield line.split(',')[1], f.readline()
+
+
+"""
+parameters:
+    release: IndexedFasta or dictionary of the form allele: sequence
+    allele: the name of the allele
+    start: first position (0 based)
+    end: position after the last one
+
+returns:
+    the part of the sequence of the allele, without reading the rest of it
+    from an IndexedFasta
+"""
+def sequence_slice(release, allele, start, end):
+    if isinstance(release, IndexedFasta):
+        return release.fetch(allele, start, end)
+    return str(release[allele][start:end])
+
+
+# a change between the old and the new sequence of an allele. kind is
+# 'substitution', 'insertion' or 'deletion', coordinates are 0 based and the
+# end is not included; ref and alt are the old and new bases
+Variant = namedtuple('Variant', ['kind', 'old_start', 'old_end', 'new_start', 'new_end', 'ref', 'alt'])
+
+_CIGAR_OP = re.compile(r'(\d+)([MIDX=])')
+
+
+"""
+parameters:
+    cigar_string: the cigar string, i.e. 12=1X3I40=
+
+returns:
+    counts: array of the count of every operation
+    ops: array of the operations (one character each)
+    old_starts: array of the offset in the old sequence where every operation starts
+    new_starts: array of the offset in the new sequence where every operation starts
+"""
+def cigar_ops(cigar_string):
+    parsed = _CIGAR_OP.findall(cigar_string)
+    counts = np.array([int(count) for count, _ in parsed], dtype=np.int64)
+    ops = np.array([op for _, op in parsed], dtype='U1')
+    old_counts = np.where(np.isin(ops, ('M', '=', 'X', 'D')), counts, 0)
+    new_counts = np.where(np.isin(ops, ('M', '=', 'X', 'I')), counts, 0)
+    return counts, ops, np.cumsum(old_counts) - old_counts, np.cumsum(new_counts) - new_counts
+
+
+"""
+goes through the cigar string and finds every substitution, insertion and
+deletion, with its coordinates in both sequences. I is for bases only in the
+new sequence and D for bases only in the old sequence; M runs are checked for
+mismatched bases
 
 parameters:
     allele: the name of the allele
     cigar_string: the cigar string to parse
-    old_dict: the dictionary of the old report (of form allele: sequence)
-    new_dict: the dictionary of the new report (of form allele: sequence)
+    old_dict: the old release (IndexedFasta or dictionary of the form allele: sequence)
+    new_dict: the new release (IndexedFasta or dictionary of the form allele: sequence)
+
+returns:
+    list of Variant, in the order of the cigar string
 """
-def parse_cigar(allele, cigar_string, old_dict, new_dict):
-    head_index = ''
-    tail_index = 0
-    old_sequence = ""
-    new_sequence = ""
-    output = ""
-    for line in old_dict[allele]:
-         old_sequence += line[:-1]
-    for line in new_dict[allele]:
-        new_sequence += line[:-1]
-    for i in range(len(cigar_string) - 1):
-        curr = cigar_string[i]
-        if curr.isdigit():
-            head_index += curr
+def cigar_events(allele, cigar_string, old_dict, new_dict):
+    counts, ops, old_starts, new_starts = cigar_ops(cigar_string)
+    events = []
+    for count, op, old_start, new_start in zip(counts.tolist(), ops.tolist(), old_starts.tolist(), new_starts.tolist()):
+        if op == 'I':
+            events.append(Variant('insertion', old_start, old_start, new_start, new_start + count,
+                                  '', sequence_slice(new_dict, allele, new_start, new_start + count)))
+        elif op == 'D':
+            events.append(Variant('deletion', old_start, old_start + count, new_start, new_start,
+                                  sequence_slice(old_dict, allele, old_start, old_start + count), ''))
+        elif op in 'MX':
+            old_bases = sequence_slice(old_dict, allele, old_start, old_start + count)
+            new_bases = sequence_slice(new_dict, allele, new_start, new_start + count)
+            runs = [(count, 'X')] if op == 'X' else match_runs(old_bases, new_bases)
+            offset = 0
+            for length, run in runs:
+                if run == 'X':
+                    events.append(Variant('substitution', old_start + offset, old_start + offset + length,
+                                          new_start + offset, new_start + offset + length,
+                                          old_bases[offset:offset + length], new_bases[offset:offset + length]))
+                offset += length
+    return events
+
+
+"""
+parameters:
+    events: list of Variant from cigar_events
+
+returns:
+    the insertion, deletion and substitution positions (1 based) and the
+    bases added, removed or replaced, as text
+"""
+def render_events(events):
+    lines = []
+    for event in events:
+        if event.kind == 'insertion':
+            if event.new_end - event.new_start == 1:
+                lines.append(f'insertion at {event.new_start + 1} (after old {event.old_start}): ')
+            else:
+                lines.append(f'Insertion from {event.new_start + 1} to {event.new_end} (after old {event.old_start}): ')
+            lines.append(event.alt)
+        elif event.kind == 'deletion':
+            if event.old_end - event.old_start == 1:
+                lines.append(f'Deletion at {event.old_start + 1} (after new {event.new_start}): ')
+            else:
+                lines.append(f'Deletion from {event.old_start + 1} to {event.old_end} (after new {event.new_start}): ')
+            lines.append(event.ref)
+        elif event.old_end - event.old_start == 1:
+            lines.append(f'Substitution at {event.old_start + 1} (new {event.new_start + 1}): ')
+            lines.append(f'{event.ref} -> {event.alt}')
         else:
-            if curr == 'I':
-                if int(int(head_index) == 1):
-                    output += (f'insertion at {int(tail_index) + 1}: \n')
-                else:
-                    output += (f'Insertion from {int(tail_index) + 1} to {int(head_index) + tail_index}\n')
-                output +=(new_sequence[tail_index:int(head_index) + tail_index] + '\n')
-            if curr == 'D':
-                if int(int(head_index) == 1):
-                    output += (f'Deletion at {int(tail_index) + 1}: \n')
-                else:
-                    output += (f'Deletion from {int(tail_index)+ 1} to {int(head_index) + tail_index}: \n')
-                output += (old_sequence[tail_index:int(head_index) + tail_index]
-                           + '\n')
-            tail_index += int(head_index)
-            head_index = ''
-    return output
+            lines.append(f'Substitution from {event.old_start + 1} to {event.old_end} '
+                         f'(new {event.new_start + 1} to {event.new_end}): ')
+            lines.append(f'{event.ref} -> {event.alt}')
+    return ''.join(line + '\n' for line in lines)
+
+
+"""
+prints the insertion, deletion and substitution indeces, aswell as the bases
+added, removed or replaced
 
+parameters:
+    allele: the name of the allele
+    cigar_string: the cigar string to parse
+    old_dict: the old release (IndexedFasta or dictionary of the form allele: sequence)
+    new_dict: the new release (IndexedFasta or dictionary of the form allele: sequence)
+"""
+def parse_cigar(allele, cigar_string, old_dict, new_dict):
+    return render_events(cigar_events(allele, cigar_string, old_dict, new_dict))
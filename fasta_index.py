@@ -0,0 +1,309 @@
+import hashlib
+import mmap
+import os
+
+
+"""
+builds a faidx-style index of a fasta file. each allele is stored as
+    name    length    offset    line_bases    line_width    digest
+where offset is the byte offset of the first base of the sequence, line_bases
+is the number of bases on a full line, line_width the number of bytes on a
+full line (bases + line break) and digest a blake2b digest of the sequence
+with line breaks removed. sequences whose lines are of different lengths (see
+regular_lines) are stored with line_bases 0 and line_width set to the number
+of bytes of the whole sequence. the file is read in a single pass
+
+parameters:
+    fasta_file: the fasta file to index
+
+returns:
+    a dictionary of the form {allele: (length, offset, line_bases, line_width, digest)}
+"""
+def build_index(fasta_file):
+    index = {}
+    with open(fasta_file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return index
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            header = mm.find(b'>')
+            while header != -1:
+                header_end = mm.find(b'\n', header)
+                if header_end == -1:
+                    header_end = size
+                name = mm[header:header_end].split()[1].decode()
+                offset = min(header_end + 1, size)
+                next_header = mm.find(b'\n>', header_end)
+                end = size if next_header == -1 else next_header
+                while end > offset and mm[end - 1] in b'\r\n':
+                    end -= 1
+                first_line_end = mm.find(b'\n', offset, end)
+                if first_line_end == -1:
+                    line_bases = line_width = end - offset
+                else:
+                    line_width = first_line_end - offset + 1
+                    line_bases = line_width - 1
+                    if mm[first_line_end - 1] == ord('\r'):
+                        line_bases -= 1
+                raw = mm[offset:end]
+                sequence = raw.replace(b'\n', b'').replace(b'\r', b'')
+                length = len(sequence)
+                if first_line_end != -1 and not regular_lines(raw, line_bases, line_width):
+                    line_bases, line_width = 0, end - offset
+                index[name] = (length, offset, line_bases, line_width, sequence_digest(sequence))
+                header = -1 if next_header == -1 else next_header + 1
+    return index
+
+
+"""
+parameters:
+    raw: the bytes of a sequence, line breaks included
+    line_bases: number of bases on the first line
+    line_width: number of bytes on the first line (bases + line break)
+
+returns:
+    True if every line but the last has line_bases bases and the same line
+    break as the first line, and the last line has at most line_bases bases,
+    so that offsets can be computed from line_bases and line_width
+"""
+def regular_lines(raw, line_bases, line_width):
+    breaks = raw[line_width - 1::line_width]
+    if breaks != b'\n' * len(breaks) or raw.count(b'\n') != len(breaks):
+        return False
+    if not 0 < len(raw) - len(breaks) * line_width <= line_bases:
+        return False
+    returns = raw[line_bases::line_width] if line_width - line_bases == 2 else b''
+    return returns == b'\r' * len(returns) and raw.count(b'\r') == len(returns)
+
+
+"""
+parameters:
+    sequence: the sequence (str or bytes) without line breaks
+
+returns:
+    a hex digest that only depends on the content of the sequence
+"""
+def sequence_digest(sequence):
+    if isinstance(sequence, str):
+        sequence = sequence.encode()
+    return hashlib.blake2b(sequence, digest_size=16).hexdigest()
+
+
+"""
+parameters:
+    fasta_file: the fasta file
+
+returns:
+    the path of the index saved next to the fasta file
+"""
+def index_path(fasta_file):
+    return f'{fasta_file}.fai'
+
+
+"""
+parameters:
+    fasta_file: the fasta file
+
+returns:
+    (size, mtime in nanoseconds) of the fasta file, saved in its index to find
+    out when the index is stale
+"""
+def fasta_stamp(fasta_file):
+    stat = os.stat(fasta_file)
+    return stat.st_size, stat.st_mtime_ns
+
+
+"""
+writes an index in the faidx format. the index is written to a temporary
+file and then replaced atomically, so a reader never sees a partial index
+
+parameters:
+    index: dictionary returned by build_index
+    output_file: the file to write to
+    stamp: fasta_stamp of the indexed file, written as a '#' header line
+"""
+def write_index(index, output_file, stamp=None):
+    temporary = f'{output_file}.{os.getpid()}.tmp'
+    try:
+        with open(temporary, 'w') as f:
+            if stamp is not None:
+                f.write(f'#fasta\t{stamp[0]}\t{stamp[1]}\n')
+            for name, (length, offset, line_bases, line_width, digest) in index.items():
+                f.write(f'{name}\t{length}\t{offset}\t{line_bases}\t{line_width}\t{digest}\n')
+        os.replace(temporary, output_file)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+"""
+parameters:
+    file: the index file to read from
+    stamp: fasta_stamp of the indexed file. if given, the index is only read
+        if it was written with the same stamp
+
+returns:
+    a dictionary of the form {allele: (length, offset, line_bases, line_width, digest)},
+    or None if the index has no digests (i.e. written by samtools faidx) or
+    its stamp does not match
+"""
+def read_index(file, stamp=None):
+    index = {}
+    with open(file, 'r') as f:
+        header = f.readline()
+        if header.startswith('#'):
+            fields = header.rstrip('\n').split('\t')
+            if stamp is not None and fields[1:] != [str(stamp[0]), str(stamp[1])]:
+                return None
+        elif stamp is not None:
+            return None
+        else:
+            f.seek(0)
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) != 6:
+                return None
+            name, length, offset, line_bases, line_width, digest = fields
+            index[name] = (int(length), int(offset), int(line_bases), int(line_width), digest)
+    return index
+
+
+"""
+loads the index saved next to the fasta file. the index is (re)built and saved
+if it is missing, has no digests, or was built from a fasta file of another
+size or mtime (like manifest.py, so a file replaced by an older one is
+noticed too)
+
+parameters:
+    fasta_file: the fasta file
+
+returns:
+    a dictionary of the form {allele: (length, offset, line_bases, line_width, digest)}
+"""
+def load_index(fasta_file):
+    fai = index_path(fasta_file)
+    stamp = fasta_stamp(fasta_file)
+    if os.path.exists(fai):
+        index = read_index(fai, stamp)
+        if index is not None:
+            return index
+    index = build_index(fasta_file)
+    try:
+        write_index(index, fai, stamp)
+    except OSError:
+        pass
+    return index
+
+
+"""
+read only, memory mapped view of an indexed fasta file. behaves like a
+dictionary of the form {allele: sequence}, but sequences are only read from
+the file when they are looked up
+
+parameters:
+    fasta_file: the fasta file to read from
+"""
+class IndexedFasta:
+    def __init__(self, fasta_file):
+        self.fasta_file = fasta_file
+        self.index = load_index(fasta_file)
+        self._file = open(fasta_file, 'rb')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._mm = b''
+        else:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __getitem__(self, allele):
+        return self.fetch(allele)
+
+    def __contains__(self, allele):
+        return allele in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def keys(self):
+        return self.index.keys()
+
+    def items(self):
+        for allele in self.index:
+            yield allele, self.fetch(allele)
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    """
+    parameters:
+        allele: the name of the allele
+
+    returns:
+        the length of the allele's sequence, without reading it
+    """
+    def length(self, allele):
+        return self.index[allele][0]
+
+    """
+    parameters:
+        allele: the name of the allele
+
+    returns:
+        the digest of the allele's sequence, without reading it
+    """
+    def digest(self, allele):
+        return self.index[allele][4]
+
+    """
+    parameters:
+        allele: the name of the allele
+
+    returns:
+        zero-copy view of the bytes holding the sequence (line breaks included)
+    """
+    def view(self, allele):
+        start, end = self._span(allele, 0, self.index[allele][0])
+        return memoryview(self._mm)[start:end]
+
+    """
+    reads part of a sequence. only the bytes between start and end are read
+
+    parameters:
+        allele: the name of the allele
+        start: first (0-based) position to read
+        end: position after the last one to read, defaults to the end of the sequence
+
+    returns:
+        the sequence between start and end with line breaks removed
+    """
+    def fetch(self, allele, start=0, end=None):
+        length = self.index[allele][0]
+        end = length if end is None else min(end, length)
+        if start >= end:
+            return ''
+        first, last = self._span(allele, start, end)
+        raw = self._mm[first:last]
+        if self.index[allele][2] == 0:
+            return raw.replace(b'\n', b'').replace(b'\r', b'')[start:end].decode()
+        if len(raw) != end - start:
+            raw = raw.replace(b'\n', b'').replace(b'\r', b'')
+        return raw.decode()
+
+    def _span(self, allele, start, end):
+        length, offset, line_bases, line_width, _ = self.index[allele]
+        if length == 0:
+            return offset, offset
+        if line_bases == 0:
+            return offset, offset + line_width
+        first = offset + (start // line_bases) * line_width + start % line_bases
+        last = offset + ((end - 1) // line_bases) * line_width + (end - 1) % line_bases + 1
+        return first, last
@@ -0,0 +1,130 @@
+import glob
+import os
+from bisect import bisect_right
+
+import numpy as np
+
+from report_db import file_type
+
+
+"""
+reads an IMGT alignment file (i.e. A_gen.txt or A_nuc.txt). the blocks of
+the alignment are joined, so every allele gets one aligned row; the spaces
+between groups of 10 are removed and the '|' feature boundaries are kept
+
+parameters:
+    alignment_file: the IMGT alignment file
+
+returns:
+    a dictionary of the form {allele: aligned row}, in the order of the file
+    (the first allele is the reference)
+"""
+def read_alignment(alignment_file):
+    rows = {}
+    with open(alignment_file, 'r') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 2 or '*' not in fields[0] or line.startswith('#'):
+                continue
+            rows.setdefault(fields[0], []).append(''.join(fields[1:]))
+    return {allele: ''.join(chunks) for allele, chunks in rows.items()}
+
+
+"""
+parameters:
+    segments: number of features in the alignment
+    kind: 'gen' (UTRs, exons and introns) or 'nuc' (exons only)
+
+returns:
+    the names of the features, i.e. ('5UTR', 'EX_1', 'INT_1', ..., 'EX_8', '3UTR'),
+    named like the files in logs/padding
+"""
+def feature_names(segments, kind):
+    if kind == 'nuc' or segments < 2:
+        return tuple(f'EX_{number}' for number in range(1, segments + 1))
+    names = ['5UTR']
+    for number in range(1, segments - 1):
+        names.append(f'EX_{(number + 1) // 2}' if number % 2 else f'INT_{number // 2}')
+    names.append('3UTR')
+    return tuple(names)
+
+
+"""
+builds the feature coordinates of every allele of one locus from its IMGT
+alignment. in the alignment '-' is the same base as the reference, '.' is a
+gap and '*' is a base that is not known; only the known bases are counted,
+so the coordinates are offsets in the sequences of the fasta files
+
+parameters:
+    alignment_file: the IMGT alignment file (i.e. A_gen.txt or A_nuc.txt)
+
+returns:
+    a dictionary of the form {allele: (starts, names)} where starts are the
+    0 based offsets where every feature starts, and names are from feature_names
+"""
+def build_feature_index(alignment_file):
+    rows = read_alignment(alignment_file)
+    if not rows:
+        return {}
+    reference = np.frombuffer(next(iter(rows.values())).encode(), dtype=np.uint8)
+    boundaries = np.flatnonzero(reference == ord('|'))
+    names = feature_names(len(boundaries) + 1, file_type(alignment_file) or 'gen')
+    index = {}
+    for allele, row in rows.items():
+        aligned = np.full(len(reference), ord('*'), dtype=np.uint8)
+        encoded = np.frombuffer(row.encode(), dtype=np.uint8)[:len(reference)]
+        aligned[:len(encoded)] = encoded
+        same = aligned == ord('-')
+        aligned[same] = reference[same]
+        known = (aligned != ord('.')) & (aligned != ord('*')) & (aligned != ord('|'))
+        before = np.cumsum(known) - known
+        index[allele] = ((0,) + tuple(before[boundaries].tolist()), names)
+    return index
+
+
+"""
+builds the feature index of every locus in a directory of IMGT alignments
+
+parameters:
+    alignment_dir: directory with the IMGT alignment files
+    kind: 'gen' or 'nuc', the alignment files read are <locus>_<kind>.txt
+
+returns:
+    a dictionary of the form {allele: (starts, names)}, like build_feature_index
+"""
+def release_features(alignment_dir, kind='gen'):
+    index = {}
+    for alignment_file in sorted(glob.glob(os.path.join(alignment_dir, f'*_{kind}.txt'))):
+        index.update(build_feature_index(alignment_file))
+    return index
+
+
+"""
+parameters:
+    index: feature index from build_feature_index or release_features
+    allele: the name of the allele
+    position: 0 based offset in the sequence of the allele
+
+returns:
+    the name of the feature at the position, i.e. 'EX_2', or None if the allele
+    is not in the index
+"""
+def feature_at(index, allele, position):
+    if allele not in index:
+        return None
+    starts, names = index[allele]
+    return names[max(bisect_right(starts, position) - 1, 0)]
+
+
+"""
+parameters:
+    index: feature index of the old release
+    allele: the name of the allele
+    events: list of describe_modifications.Variant of the allele
+
+returns:
+    list of (event, feature), where the feature is the one of the first old
+    base of the event (for an insertion, the base it is inserted before)
+"""
+def annotate_events(index, allele, events):
+    return [(event, feature_at(index, allele, event.old_start)) for event in events]
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+
+
+# name of the manifest saved in every release directory
+MANIFEST_NAME = '.manifest.json'
+
+
+"""
+parameters:
+    file: the file to hash
+    chunk_size: number of bytes read at a time
+
+returns:
+    blake2b digest of the content of the file
+"""
+def file_digest(file, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file, 'rb') as f:
+        chunk = f.read(chunk_size)
+        while chunk:
+            digest.update(chunk)
+            chunk = f.read(chunk_size)
+    return digest.hexdigest()
+
+
+"""
+loads the manifest of a release directory. the manifest records the size,
+mtime and digest of every file, and is saved as .manifest.json in the
+directory. only files that are new or whose size or mtime changed since the
+manifest was saved are hashed again. index files (.fai) are not included
+
+parameters:
+    directory: the release directory
+
+returns:
+    a dictionary of the form {file: {'size': size, 'mtime': mtime, 'digest': digest}}
+"""
+def load_manifest(directory):
+    saved = read_manifest(directory)
+    manifest = {}
+    for entry in os.scandir(directory):
+        if entry.name == MANIFEST_NAME or entry.name.endswith('.fai') or not entry.is_file():
+            continue
+        stat = entry.stat()
+        record = saved.get(entry.name)
+        if record is None or record['size'] != stat.st_size or record['mtime'] != stat.st_mtime_ns:
+            record = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'digest': file_digest(entry.path)}
+        manifest[entry.name] = record
+    if manifest != saved:
+        write_manifest(directory, manifest)
+    return manifest
+
+
+"""
+parameters:
+    directory: the release directory
+
+returns:
+    the manifest saved in the directory, or an empty dictionary if there is
+    none (or it cannot be read)
+"""
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+"""
+saves the manifest of a directory. the manifest is written to a temporary
+file and then replaced atomically. errors (i.e. read only directories) are
+ignored, the manifest is only a cache
+
+parameters:
+    directory: the release directory
+    manifest: the manifest to save
+"""
+def write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_NAME)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temporary, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(temporary, path)
+    except OSError:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+"""
+returns the manifest record of a single file. only this file is hashed (if it
+is new or its size or mtime changed), and only its entry of the manifest of
+its directory is updated
+
+parameters:
+    file: the file
+
+returns:
+    a dictionary of the form {'size': size, 'mtime': mtime, 'digest': digest}
+"""
+def manifest_entry(file):
+    directory, name = os.path.split(file)
+    directory = directory or '.'
+    stat = os.stat(file)
+    saved = read_manifest(directory)
+    record = saved.get(name)
+    if record is None or record['size'] != stat.st_size or record['mtime'] != stat.st_mtime_ns:
+        record = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'digest': file_digest(file)}
+        saved[name] = record
+        write_manifest(directory, saved)
+    return record
+
+
+"""
+parameters:
+    manifest1: manifest of the first directory
+    manifest2: manifest of the second directory
+    file: name of the file in both directories
+
+returns:
+    True if the file is the same in both directories, False otherwise
+"""
+def same_entry(manifest1, manifest2, file):
+    record1 = manifest1[file]
+    record2 = manifest2[file]
+    return record1['size'] == record2['size'] and record1['digest'] == record2['digest']
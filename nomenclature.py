@@ -0,0 +1,102 @@
+import sys
+from functools import lru_cache
+
+
+# expression suffixes, i.e. the N in A*02:06:09N
+SUFFIXES = 'NLSCAQ'
+
+
+"""
+parsed HLA allele name, i.e. DRB1*15:01:01:02N. parsed names are cached, so
+every unique name is parsed once and equal names share one record
+
+parameters:
+    name: the full name of the allele
+    locus: the locus, i.e. DRB1
+    fields: the numeric fields as ints, i.e. (15, 1, 1, 2)
+    suffix: the expression suffix, i.e. 'N', or ''
+"""
+class AlleleName:
+    __slots__ = ('name', 'locus', 'fields', 'suffix', 'sort_key')
+
+    def __init__(self, name, locus, fields, suffix):
+        self.name = name
+        self.locus = locus
+        self.fields = fields
+        self.suffix = suffix
+        self.sort_key = (locus, fields, suffix)
+
+    def __repr__(self):
+        return f'AlleleName({self.name!r})'
+
+    def __str__(self):
+        return self.name
+
+    def __eq__(self, other):
+        if not isinstance(other, AlleleName):
+            return NotImplemented
+        return self.name == other.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+    """
+    parameters:
+        prefix: AlleleName with fewer fields, i.e. A*03:01
+
+    returns:
+        True if this allele has all the fields of the prefix and more, i.e.
+        A*03:01:02 for A*03:01, but not A*03:010 or A*03:01 itself
+    """
+    def descends_from(self, prefix):
+        return (self.locus == prefix.locus and len(self.fields) > len(prefix.fields)
+                and self.fields[:len(prefix.fields)] == prefix.fields)
+
+
+"""
+parameters:
+    name: the name of the allele, i.e. DRB1*15:01:01:02N
+
+returns:
+    the AlleleName of the name
+
+raises:
+    ValueError if the name has no locus or its fields are not numbers
+"""
+@lru_cache(maxsize=None)
+def parse_allele(name):
+    locus, star, rest = name.partition('*')
+    suffix = ''
+    if rest and rest[-1] in SUFFIXES:
+        rest, suffix = rest[:-1], rest[-1]
+    if not star or not locus or not rest:
+        raise ValueError(f'not an allele name: {name}')
+    fields = tuple(int(field) for field in rest.split(':'))
+    return AlleleName(sys.intern(name), sys.intern(locus), fields, suffix)
+
+
+"""
+parameters:
+    locus: the locus, i.e. A
+    fields: the numeric fields, i.e. (2, 5)
+    suffix: the expression suffix, i.e. 'N', or ''
+
+returns:
+    the name of the allele with every field at least two digits, i.e. A*02:05
+"""
+def format_allele(locus, fields, suffix=''):
+    return f'{locus}*' + ':'.join(f'{field:02d}' for field in fields) + suffix
+
+
+"""
+parameters:
+    version: IMGT release, i.e. '3.56' or '3.56.0'
+
+returns:
+    tuple of ints used to sort releases
+"""
+def version_key(version):
+    return tuple(int(field) for field in version.split('.'))
@@ -0,0 +1,135 @@
+import numpy as np
+
+from fasta_index import sequence_digest
+
+
+# 2 bit code of every base, 255 for characters that are not A, C, G or T
+_CODES = np.full(256, 255, dtype=np.uint8)
+_CODES[np.frombuffer(b'ACGT', dtype=np.uint8)] = np.arange(4, dtype=np.uint8)
+_BASES = np.frombuffer(b'ACGT', dtype=np.uint8)
+
+
+"""
+compact, immutable nucleotide sequence. A, C, G and T are packed 4 bases to a
+byte; every other character (N and other IUPAC codes, '*' placeholders, ...)
+is kept in a side table of runs (start, length, character). slicing returns a
+str and only unpacks the bytes covering the slice
+
+parameters:
+    sequence: the sequence (str or bytes)
+"""
+class PackedSequence:
+    __slots__ = ('length', 'packed', 'run_starts', 'run_lengths', 'run_chars', '_hash', '_digest')
+
+    def __init__(self, sequence):
+        if isinstance(sequence, str):
+            sequence = sequence.encode()
+        raw = np.frombuffer(sequence, dtype=np.uint8)
+        codes = _CODES[raw]
+        other = np.flatnonzero(codes == 255)
+        if len(other):
+            breaks = np.flatnonzero((np.diff(other) != 1) | (raw[other[1:]] != raw[other[:-1]])) + 1
+            starts = other[np.insert(breaks, 0, 0)]
+            ends = other[np.append(breaks, len(other)) - 1] + 1
+            self.run_starts = starts.astype(np.uint32)
+            self.run_lengths = (ends - starts).astype(np.uint32)
+            self.run_chars = raw[starts].tobytes()
+            codes[other] = 0
+        else:
+            self.run_starts = self.run_lengths = np.zeros(0, dtype=np.uint32)
+            self.run_chars = b''
+        padded = np.zeros(-(-len(codes) // 4) * 4, dtype=np.uint8)
+        padded[:len(codes)] = codes
+        quads = padded.reshape(-1, 4)
+        self.packed = ((quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2) | quads[:, 3]).tobytes()
+        self.length = len(raw)
+        self._hash = None
+        self._digest = None
+
+    def __len__(self):
+        return self.length
+
+    def __str__(self):
+        return self._unpack(0, self.length).decode()
+
+    def __bytes__(self):
+        return self._unpack(0, self.length)
+
+    def __repr__(self):
+        return f'PackedSequence({str(self)!r})'
+
+    def __iter__(self):
+        return iter(str(self))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            if step != 1:
+                return str(self)[key]
+            return self._unpack(start, max(start, stop)).decode()
+        if key < 0:
+            key += self.length
+        if not 0 <= key < self.length:
+            raise IndexError('PackedSequence index out of range')
+        return self._unpack(key, key + 1).decode()
+
+    def __contains__(self, item):
+        if len(item) == 1 and item not in 'ACGT':
+            return item.encode() in self.run_chars
+        return item in str(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, PackedSequence):
+            return NotImplemented
+        return (self.length == other.length and self.packed == other.packed
+                and self.run_chars == other.run_chars
+                and np.array_equal(self.run_starts, other.run_starts)
+                and np.array_equal(self.run_lengths, other.run_lengths))
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((self.length, self.packed, self.run_chars,
+                               self.run_starts.tobytes(), self.run_lengths.tobytes()))
+        return self._hash
+
+    """
+    returns:
+        the same digest as fasta_index.sequence_digest of the unpacked sequence
+    """
+    def digest(self):
+        if self._digest is None:
+            self._digest = sequence_digest(bytes(self))
+        return self._digest
+
+    """
+    returns:
+        number of bytes used by the packed bases and the side table
+    """
+    def nbytes(self):
+        return len(self.packed) + self.run_starts.nbytes + self.run_lengths.nbytes + len(self.run_chars)
+
+    def _unpack(self, start, end):
+        if start >= end:
+            return b''
+        first = start // 4
+        packed = np.frombuffer(self.packed, dtype=np.uint8, count=(end + 3) // 4 - first, offset=first)
+        codes = np.stack(((packed >> 6) & 3, (packed >> 4) & 3, (packed >> 2) & 3, packed & 3), axis=1).ravel()
+        bases = _BASES[codes[start - first * 4:end - first * 4]]
+        if self.run_chars:
+            runs = np.flatnonzero((self.run_starts < end) & (self.run_starts + self.run_lengths > start))
+            for run in runs.tolist():
+                run_start = max(int(self.run_starts[run]), start)
+                run_end = min(int(self.run_starts[run] + self.run_lengths[run]), end)
+                bases[run_start - start:run_end - start] = self.run_chars[run]
+        return bases.tobytes()
+
+
+"""
+parameters:
+    release: dictionary of the form {allele: sequence}, i.e. from allele_dict
+
+returns:
+    a dictionary of the form {allele: PackedSequence}
+"""
+def pack_release(release):
+    return {allele: PackedSequence(sequence) for allele, sequence in release.items()}
@@ -0,0 +1,100 @@
+import os
+import re
+import sqlite3
+
+
+# status of every allele in a report
+STATUSES = ('New', 'Modified', 'Deleted')
+
+
+"""
+parameters:
+    file: path of a report
+
+returns:
+    True if the report is a sqlite report (.db or .sqlite), False if it is a
+    text report
+"""
+def is_report_db(file):
+    return str(file).endswith(('.db', '.sqlite'))
+
+
+"""
+parameters:
+    file: fasta file of a release, i.e. hla_gen.fasta or A_prot.fasta
+
+returns:
+    'gen', 'nuc' or 'prot', or '' if the name does not say
+"""
+def file_type(file):
+    match = re.search(r'(?:^|[_.])(gen|nuc|prot)(?:[_.]|$)', os.path.basename(file))
+    return match.group(1) if match else ''
+
+
+"""
+parameters:
+    allele: the name of the allele, i.e. DRB1*15:01:01:02N
+
+returns:
+    the locus of the allele, i.e. DRB1
+"""
+def allele_locus(allele):
+    return allele.split('*', 1)[0]
+
+
+"""
+writes a report to a sqlite file, replacing any report already in it. every
+allele is one row of the alleles table:
+    allele, status, locus, file_type, cigar, new_digest, old_digest
+all rows are written in a single transaction
+
+parameters:
+    output_file: the sqlite file to write to
+    rows: iterable of (allele, status, file_type, cigar, new_digest, old_digest)
+    append: add the rows to the report already in the file instead of replacing it
+"""
+def write_report(output_file, rows, append=False):
+    connection = sqlite3.connect(output_file)
+    with connection:
+        if not append:
+            connection.execute('DROP TABLE IF EXISTS alleles')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS alleles (allele TEXT PRIMARY KEY, status TEXT, locus TEXT, '
+            'file_type TEXT, cigar TEXT, new_digest TEXT, old_digest TEXT)')
+        connection.executemany(
+            'INSERT OR REPLACE INTO alleles VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ((allele, status, allele_locus(allele), kind, cigar, new_digest, old_digest)
+             for allele, status, kind, cigar, new_digest, old_digest in rows))
+        connection.execute('CREATE INDEX IF NOT EXISTS alleles_status ON alleles (status, allele)')
+    connection.close()
+
+
+"""
+parameters:
+    file: the sqlite report to read from
+
+returns:
+    a dictionary of the form {allele: ['New', 'Modified', 'Deleted']}, like
+    compare_reports.create_dict
+"""
+def read_statuses(file):
+    connection = sqlite3.connect(file)
+    output = {allele: [status] for allele, status in connection.execute('SELECT allele, status FROM alleles')}
+    connection.close()
+    return output
+
+
+"""
+parameters:
+    file: the sqlite report to read from
+
+returns:
+    generator of the (allele, cigar) of every modified allele, sorted by allele
+"""
+def modified_alleles(file):
+    connection = sqlite3.connect(file)
+    try:
+        yield from connection.execute(
+            "SELECT allele, cigar FROM alleles WHERE status = 'Modified' ORDER BY allele")
+    finally:
+        connection.close()
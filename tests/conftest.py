@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+# Adjust the path to include the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fasta_records():
+    return {
+        'A*01:01:01:01': 'ACGTACGTAC' * 13 + 'ACG',
+        'A*01:02': 'TTGCA' * 7,
+        'A*02:01:01': 'GATTACA',
+        'A*03:01': '',
+    }
+
+
+"""
+returns:
+    function that writes a fasta file with every record split into lines of
+    line_bases bases: write_fasta(path, records, line_bases=60, newline='\\n')
+"""
+@pytest.fixture
+def write_fasta():
+    def write(path, records, line_bases=60, newline='\n'):
+        with open(path, 'w', newline='') as f:
+            for number, (allele, sequence) in enumerate(records.items()):
+                f.write(f'>HLA:HLA{number:05d} {allele} {len(sequence)} bp{newline}')
+                for start in range(0, len(sequence), line_bases):
+                    f.write(sequence[start:start + line_bases] + newline)
+    return write
@@ -0,0 +1,161 @@
+import random
+
+import pytest
+
+import align_alleles
+from align_alleles import (align_pair, align_pair_fast, align_pair_protein, alignment_cigar, banded_alignment,
+                           cigar_runs, create_aligner, use_banded)
+
+
+"""
+parameters:
+    runs: list of (count, operation) runs
+    aligner: the aligner to take the scores from
+
+returns:
+    the score of the alignment described by the runs
+"""
+def runs_score(runs, aligner):
+    scores = {'=': aligner.match_score, 'X': aligner.mismatch_score, 'I': aligner.gap_score, 'D': aligner.gap_score}
+    return sum(count * scores[operation] for count, operation in runs)
+
+
+"""
+returns:
+    the sequence with a few random substitutions, insertions and deletions
+"""
+def mutate(sequence, rng):
+    for _ in range(rng.randint(1, 4)):
+        position = rng.randrange(len(sequence))
+        change = rng.random()
+        if change < 0.5:
+            sequence = sequence[:position] + rng.choice('ACGT') + sequence[position + 1:]
+        elif change < 0.75:
+            sequence = sequence[:position] + ''.join(rng.choices('ACGT', k=rng.randint(1, 6))) + sequence[position:]
+        else:
+            sequence = sequence[:position] + sequence[position + rng.randint(1, 6):]
+    return sequence
+
+
+"""
+checks that the cigar turns old into new, and returns its runs
+"""
+def check_cigar(cigar, new, old):
+    runs = cigar_runs(cigar)
+    i = j = 0
+    for count, operation in runs:
+        if operation == '=':
+            assert new[i:i + count] == old[j:j + count]
+        elif operation == 'X':
+            assert all(a != b for a, b in zip(new[i:i + count], old[j:j + count]))
+        i += count if operation != 'D' else 0
+        j += count if operation != 'I' else 0
+    assert (i, j) == (len(new), len(old))
+    return runs
+
+
+@pytest.mark.parametrize('gap_score', [0, -1])
+def test_banded_score_is_optimal(gap_score):
+    rng = random.Random(4)
+    aligner = create_aligner()
+    aligner.mismatch_score = min(gap_score, aligner.mismatch_score)
+    aligner.gap_score = gap_score
+    for _ in range(200):
+        old = ''.join(rng.choices('ACGT', k=rng.randint(20, 150)))
+        new = mutate(old, rng)
+        runs = banded_alignment(new, old, aligner, 8)
+        if runs is None:
+            continue
+        check_cigar(''.join(f'{count}{operation}' for count, operation in runs), new, old)
+        assert runs_score(runs, aligner) == aligner.score(new, old)
+
+
+def test_banded_overflow():
+    rng = random.Random(5)
+    aligner = create_aligner()
+    old = ''.join(rng.choices('ACGT', k=120))
+    new = old[:30] + ''.join(rng.choices('ACGT', k=40)) + old[90:]
+    assert banded_alignment(new, old, aligner, 2) is None
+    runs = check_cigar(align_pair_fast(new, old, aligner, 2), new, old)
+    assert runs_score(runs, aligner) == aligner.score(new, old)
+
+
+"""
+returns:
+    the sequence with a substitution at every position
+"""
+def substitute(sequence, positions):
+    for position in positions:
+        sequence = sequence[:position] + ('A' if sequence[position] != 'A' else 'C') + sequence[position + 1:]
+    return sequence
+
+
+"""
+replaces banded_alignment with a wrapper that records its results
+"""
+def record_banded(monkeypatch):
+    calls = []
+    banded = align_alleles.banded_alignment
+
+    def wrapper(*args):
+        calls.append(banded(*args))
+        return calls[-1]
+
+    monkeypatch.setattr(align_alleles, 'banded_alignment', wrapper)
+    return calls
+
+
+def test_fast_takes_band_for_gen_sized_pair(monkeypatch):
+    rng = random.Random(6)
+    aligner = create_aligner()
+    old = ''.join(rng.choices('ACGT', k=3200))
+    new = substitute(old[:1500] + old[1504:], (10, 800, 3180))
+    assert use_banded(len(new) - 20, len(old) - 20)
+    calls = record_banded(monkeypatch)
+    cigar = align_pair_fast(new, old, aligner)
+    assert len(calls) == 1 and calls[0] is not None
+    runs = check_cigar(cigar, new, old)
+    assert runs_score(runs, aligner) == aligner.score(new, old)
+
+
+def test_fast_falls_back_when_band_is_slower(monkeypatch):
+    rng = random.Random(7)
+    aligner = create_aligner()
+    old = ''.join(rng.choices('ACGT', k=600))
+    new = substitute(old, (10, 590))
+    assert not use_banded(581, 581)
+    calls = record_banded(monkeypatch)
+    runs = check_cigar(align_pair_fast(new, old, aligner), new, old)
+    assert calls == []
+    assert runs_score(runs, aligner) == aligner.score(new, old)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_fast_matches_full_score(seed):
+    rng = random.Random(seed)
+    aligner = create_aligner()
+    old = ''.join(rng.choices('ACGT', k=400))
+    new = mutate(old, rng)
+    runs = check_cigar(align_pair_fast(new, old, aligner), new, old)
+    assert runs_score(runs, aligner) == aligner.score(new, old)
+
+
+def test_protein_same_length():
+    rng = random.Random(8)
+    old = ''.join(rng.choices('ACDEFGHIKLMNPQRSTVWY', k=365))
+    new = old[:24] + ('W' if old[24] != 'W' else 'Y') + old[25:300] + ('W' if old[300] != 'W' else 'Y') + old[301:]
+    cigar = align_pair_protein(new, old)
+    assert cigar == '24=1X275=1X64='
+    assert align_pair_protein(old, old) == '365='
+
+
+def test_protein_different_length():
+    rng = random.Random(9)
+    old = ''.join(rng.choices('ACDEFGHIKLMNPQRSTVWY', k=365))
+    new = old[:100] + 'GW' + old[100:250] + old[253:]
+    aligner = create_aligner(True)
+    assert aligner.substitution_matrix['W', 'W'] == 11 and aligner.substitution_matrix['W', 'F'] == 1
+    cigar = align_pair_protein(new, old)
+    assert cigar == alignment_cigar(aligner.align(new, old)[0])
+    runs = check_cigar(cigar, new, old)
+    assert {operation for _, operation in runs} >= {'I', 'D'}
@@ -0,0 +1,89 @@
+from itertools import count
+
+import pytest
+
+import align_alleles
+import alignment_cache
+import create_report
+from align_alleles import aligner_parameters
+from alignment_cache import AlignmentCache
+
+
+"""
+replaces time.time in alignment_cache with a clock that ticks once per call,
+so that last_used orders the calls
+"""
+@pytest.fixture
+def clock(monkeypatch):
+    ticks = count(1)
+    monkeypatch.setattr(alignment_cache.time, 'time', lambda: float(next(ticks)))
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    with AlignmentCache(path) as cache:
+        cache.put_many({('new1', 'old1'): '10=', ('new2', 'old2'): '3=1X6='}, 'parameters')
+    with AlignmentCache(path) as cache:
+        assert len(cache) == 2
+        assert cache.get_many([('new1', 'old1'), ('new2', 'old2'), ('new3', 'old3')], 'parameters') == \
+            {('new1', 'old1'): '10=', ('new2', 'old2'): '3=1X6='}
+        assert cache.get_many([('old1', 'new1')], 'parameters') == {}
+
+
+"""
+returns:
+    the new digests in the cache, read without refreshing their last use
+"""
+def stored(cache):
+    return sorted(row[0] for row in cache.connection.execute('SELECT new_digest FROM cigars'))
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    with AlignmentCache(str(tmp_path / 'cache.db'), max_entries=3) as cache:
+        for number in range(3):
+            cache.put_many({(f'new{number}', f'old{number}'): f'{number}='}, 'parameters')
+        assert cache.get_many([('new0', 'old0')], 'parameters') == {('new0', 'old0'): '0='}
+        cache.put_many({('new3', 'old3'): '3='}, 'parameters')
+        assert stored(cache) == ['new0', 'new2', 'new3']
+        cache.put_many({('new4', 'old4'): '4=', ('new5', 'old5'): '5='}, 'parameters')
+        assert stored(cache) == ['new3', 'new4', 'new5']
+        cache.get_many([('new3', 'old3'), ('new9', 'old9')], 'parameters')
+        cache.put_many({('new6', 'old6'): '6='}, 'parameters')
+        assert stored(cache) == ['new3', 'new5', 'new6']
+
+
+def test_parameters_are_part_of_the_key(tmp_path):
+    keys = {aligner_parameters(), aligner_parameters(fast=True), aligner_parameters(protein=True),
+            aligner_parameters(fast=True, protein=True)}
+    assert len(keys) == 3
+    assert aligner_parameters(protein=True) == aligner_parameters(fast=True, protein=True)
+    with AlignmentCache(str(tmp_path / 'cache.db')) as cache:
+        cache.put_many({('new', 'old'): '10='}, aligner_parameters())
+        assert cache.get_many([('new', 'old')], aligner_parameters(fast=True)) == {}
+        assert cache.get_many([('new', 'old')], aligner_parameters(protein=True)) == {}
+
+
+def test_band_width_changes_parameters(monkeypatch):
+    fast = aligner_parameters(fast=True)
+    monkeypatch.setattr(align_alleles, 'BAND_WIDTH', align_alleles.BAND_WIDTH + 1)
+    assert aligner_parameters(fast=True) != fast
+    assert aligner_parameters() == aligner_parameters()
+
+
+def test_modified_cigars_uses_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache.db')
+    new = {'A*01:01': 'ACGTACGTAC', 'A*02:01': 'GATTACA'}
+    old = {'A*01:01': 'ACGTTCGTAC', 'A*02:01': 'GATACA'}
+    cigars = create_report.modified_cigars(new, old, list(new), processes=1, cache=path)
+    aligned = []
+
+    def align_pairs(pairs, *args, **kwargs):
+        pairs = list(pairs)
+        aligned.extend(pairs)
+        return [align_alleles.align_pair(*pair) for pair in pairs]
+
+    monkeypatch.setattr(create_report, 'align_pairs', align_pairs)
+    assert create_report.modified_cigars(new, old, list(new), processes=1, cache=path) == cigars
+    assert aligned == []
+    create_report.modified_cigars(new, old, list(new), processes=1, fast=True, cache=path)
+    assert len(aligned) == 2
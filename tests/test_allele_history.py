@@ -0,0 +1,51 @@
+import pytest
+
+from allele_history import allele_timeline, build_history
+
+
+@pytest.fixture
+def history(tmp_path, write_fasta):
+    first = 'ACGTACGTACGTACGTACGT'
+    substituted = first[:5] + 'G' + first[6:]
+    inserted = substituted[:10] + 'TT' + substituted[10:]
+    releases = {
+        '3.2.0': {'A*01:01': first, 'A*02:01': 'GATTACAGATTACA', 'A*03:01': 'CCCCGGGG'},
+        '3.9.0': {'A*01:01': substituted, 'A*03:01': 'CCCCGGGG', 'A*04:01': 'TTTTAAAA'},
+        '3.10.0': {'A*01:01': substituted, 'A*02:01': 'GATTACAGATTACA', 'A*03:01': 'CCCCGGGG',
+                   'A*04:01': 'TTTTAAAA'},
+        '3.11.0': {'A*01:01': inserted, 'A*02:01': 'GATTACAGATTACA', 'A*03:01': 'CCCCGGGG',
+                   'A*04:01': 'TTTTAAAA'},
+    }
+    files = []
+    for version in ('3.10.0', '3.2.0', '3.11.0', '3.9.0'):
+        path = str(tmp_path / f'hla_nuc_{version.replace(".", "")}.fasta')
+        write_fasta(path, releases[version])
+        files.append((version, path))
+    output_file = str(tmp_path / 'history.db')
+    build_history(files, output_file, processes=1)
+    return output_file
+
+
+def test_releases_are_ordered_by_version(history):
+    assert [release for release, _, _ in allele_timeline(history, 'A*03:01')] == ['3.2.0']
+    assert allele_timeline(history, 'A*01:01') == [
+        ('3.2.0', 'New', None),
+        ('3.9.0', 'Modified', '5=1X14='),
+        ('3.11.0', 'Modified', '10=2I10='),
+    ]
+
+
+def test_deleted_and_added_back(history):
+    assert allele_timeline(history, 'A*02:01') == [
+        ('3.2.0', 'New', None),
+        ('3.9.0', 'Deleted', None),
+        ('3.10.0', 'New', None),
+    ]
+    assert allele_timeline(history, 'A*04:01') == [('3.9.0', 'New', None)]
+    assert allele_timeline(history, 'B*07:02') == []
+
+
+def test_since(history):
+    assert allele_timeline(history, 'A*01:01', since='3.10') == [('3.11.0', 'Modified', '10=2I10=')]
+    assert allele_timeline(history, 'A*02:01', since='3.9.0') == [('3.9.0', 'Deleted', None), ('3.10.0', 'New', None)]
+    assert allele_timeline(history, 'A*01:01', since='3.12') == []
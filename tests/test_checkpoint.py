@@ -0,0 +1,74 @@
+import os
+import random
+import sqlite3
+
+import pytest
+
+from create_report import allele_comparison
+
+
+"""
+stop event that is set after the first check, so a run stops after one batch
+"""
+class StopAfterFirstBatch:
+    def __init__(self):
+        self.checks = 0
+
+    def is_set(self):
+        self.checks += 1
+        return self.checks > 1
+
+
+@pytest.fixture
+def releases(tmp_path, write_fasta):
+    rng = random.Random(12)
+    old = {f'A*01:{number:02d}': ''.join(rng.choices('ACGT', k=120)) for number in range(1, 21)}
+    new = {}
+    for number, (allele, sequence) in enumerate(old.items()):
+        if number % 7 == 3:
+            continue
+        if number % 2:
+            position = rng.randrange(len(sequence))
+            sequence = sequence[:position] + 'TTG' + sequence[position + 1:]
+        new[allele] = sequence
+    new['A*01:99'] = 'ACGT' * 20
+    write_fasta(str(tmp_path / 'new_gen.fasta'), new)
+    write_fasta(str(tmp_path / 'old_gen.fasta'), old)
+    return str(tmp_path / 'new_gen.fasta'), str(tmp_path / 'old_gen.fasta')
+
+
+def test_text_resume_is_byte_identical(tmp_path, releases):
+    new, old = releases
+    expected = str(tmp_path / 'expected.txt')
+    output = str(tmp_path / 'report.txt')
+    assert allele_comparison(new, old, expected, processes=1) is not None
+    stop = StopAfterFirstBatch()
+    assert allele_comparison(new, old, output, 1, checkpoint=True, batch_size=2, stop_event=stop) is None
+    assert os.path.exists(f'{output}.ckpt')
+    with open(output, 'r') as f:
+        assert f.read().count('Modified,') == 2
+    with open(output, 'a') as f:
+        f.write('Modified,A*01:garbage,\n1X\n')
+    assert allele_comparison(new, old, output, 1, checkpoint=True, batch_size=2) is not None
+    assert not os.path.exists(f'{output}.ckpt')
+    with open(expected, 'rb') as f1, open(output, 'rb') as f2:
+        assert f1.read() == f2.read()
+
+
+def test_db_resume_matches_uninterrupted_run(tmp_path, releases):
+    new, old = releases
+    expected = str(tmp_path / 'expected.db')
+    output = str(tmp_path / 'report.db')
+    allele_comparison(new, old, expected, processes=1)
+    stop = StopAfterFirstBatch()
+    assert allele_comparison(new, old, output, 1, checkpoint=True, batch_size=2, stop_event=stop) is None
+    assert allele_comparison(new, old, output, 1, checkpoint=True, batch_size=2) is not None
+
+    def rows(file):
+        connection = sqlite3.connect(file)
+        output = connection.execute('SELECT * FROM alleles ORDER BY allele').fetchall()
+        connection.close()
+        return output
+
+    assert rows(output) == rows(expected)
+    assert len([row for row in rows(output) if row[1] == 'Modified']) > 2
@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from compare_reports import backtest, parse_deleted
+
+
+def test_parse_deleted_rejects_false_matches():
+    scisco_dict = {
+        'B*51:39': ['Deleted'],
+        'B*51:399': ['New'],
+        'B*51:39:01': ['New'],
+        'B*51:39:02': ['New'],
+        'A*03:11N': ['Deleted'],
+        'A*03:11:01N': ['New'],
+        'A*03:11:02N': ['New'],
+        'C*03:10': ['Deleted'],
+        'C*03:100': ['New'],
+        'C*03:10:01': ['New'],
+        'C*03:10:02': ['Modified'],
+        'B*07:02': ['New'],
+    }
+    output = parse_deleted({'B*51:39', 'A*03:11N', 'C*03:10', 'B*07:02'}, scisco_dict)
+    assert output == {
+        'B*51:39': ['B*51:39:01', 'B*51:39:02'],
+        'A*03:11N': ['A*03:11:01N', 'A*03:11:02N'],
+        'C*03:10': ['C*03:10:01', 'C*03:10:02'],
+    }
+
+
+def write_imgt_report(path, version):
+    header = f'# version: IPD-IMGT/HLA {version}\n' if version else ''
+    path.write_text(header + 'Status,Alleles,Description\nNew,A*01:01,\n')
+    return str(path)
+
+
+def test_backtest_sorts_releases_by_version(tmp_path):
+    ours = tmp_path / 'ours.txt'
+    ours.write_text('New,A*01:01\n')
+    triples = [(str(ours), str(ours), write_imgt_report(tmp_path / f'imgt_{number}.txt', version))
+               for number, version in enumerate(['3.10.0', None, '3.9.0', '3.56.0'])]
+    results = backtest(triples, str(tmp_path / 'backtest.csv'), processes=1)
+    assert list(results) == ['3.9.0', '3.10.0', '3.56.0', 'imgt_1.txt']
+    rows = (tmp_path / 'backtest.csv').read_text().splitlines()[1:]
+    assert [row.split(',')[0] for row in rows[::2]] == list(results)
+
+
+def test_backtest_rejects_duplicate_releases(tmp_path):
+    ours = tmp_path / 'ours.txt'
+    ours.write_text('New,A*01:01\n')
+    triples = [(str(ours), str(ours), write_imgt_report(tmp_path / f'imgt_{number}.txt', '3.56.0'))
+               for number in range(2)]
+    with pytest.raises(ValueError):
+        backtest(triples, str(tmp_path / 'backtest.csv'), processes=1)
+
+
+def test_import_does_not_load_aligners():
+    code = 'import sys, compare_reports; print(sorted({"Bio", "create_report", "allele_history"} & set(sys.modules)))'
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == '[]'
@@ -0,0 +1,24 @@
+import pytest
+
+import create_report
+from report_db import file_type
+
+
+@pytest.mark.parametrize('name, kind', [('hla_prot_3560.fasta', 'prot'), ('A_prot.fasta', 'prot'),
+                                        ('hla_nuc_3560.fasta', 'nuc'), ('A_gen.fasta', 'gen')])
+def test_prot_files_are_compared_as_proteins(tmp_path, monkeypatch, write_fasta, name, kind):
+    assert file_type(name) == kind
+    (tmp_path / 'new').mkdir()
+    (tmp_path / 'old').mkdir()
+    new, old = str(tmp_path / 'new' / name), str(tmp_path / 'old' / name)
+    write_fasta(new, {'A*01:01': 'MAVMAPRTLL'})
+    write_fasta(old, {'A*01:01': 'MAVMAPRTLV'})
+    calls = []
+
+    def modified_cigars(dict1, dict2, modified, processes=None, fast=False, cache=None, protein=False):
+        calls.append(protein)
+        return {allele: '9=1X' for allele in modified}
+
+    monkeypatch.setattr(create_report, 'modified_cigars', modified_cigars)
+    create_report.allele_comparison(new, old, str(tmp_path / 'report.txt'), processes=1)
+    assert calls == [kind == 'prot']
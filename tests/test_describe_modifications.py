@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from align_alleles import align_pair, cigar_runs, generate_cigar
+from describe_modifications import Variant, cigar_events
+
+
+"""
+returns:
+    the old sequence with every event applied, i.e. the new sequence if the
+    events are right
+"""
+def replay(old, events):
+    output = []
+    position = 0
+    for event in events:
+        output.append(old[position:event.old_start])
+        output.append(event.alt)
+        position = event.old_end
+    output.append(old[position:])
+    return ''.join(output)
+
+
+"""
+returns:
+    the old and new sequence with '-' for the bases missing from one of them,
+    the input of generate_cigar
+"""
+def gapped(old, new, cigar):
+    old_gapped, new_gapped = [], []
+    old_position = new_position = 0
+    for count, operation in cigar_runs(cigar):
+        if operation == 'I':
+            old_gapped.append('-' * count)
+            new_gapped.append(new[new_position:new_position + count])
+            new_position += count
+        elif operation == 'D':
+            old_gapped.append(old[old_position:old_position + count])
+            new_gapped.append('-' * count)
+            old_position += count
+        else:
+            old_gapped.append(old[old_position:old_position + count])
+            new_gapped.append(new[new_position:new_position + count])
+            old_position += count
+            new_position += count
+    return ''.join(old_gapped), ''.join(new_gapped)
+
+
+def check_events(old, new, events):
+    assert replay(old, events) == new
+    for event in events:
+        assert old[event.old_start:event.old_end] == event.ref
+        assert new[event.new_start:event.new_end] == event.alt
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_events_replay_to_new_sequence(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        old = ''.join(rng.choices('ACGT', k=rng.randint(20, 120)))
+        new = old
+        for _ in range(rng.randint(1, 4)):
+            position = rng.randrange(len(new))
+            change = rng.random()
+            if change < 0.5:
+                new = new[:position] + rng.choice('ACGT') + new[position + 1:]
+            elif change < 0.75:
+                new = new[:position] + ''.join(rng.choices('ACGT', k=rng.randint(1, 5))) + new[position:]
+            else:
+                new = new[:position] + new[position + rng.randint(1, 5):]
+        cigar = align_pair(new, old)
+        releases = {'A*01:01': old}, {'A*01:01': new}
+        check_events(old, new, cigar_events('A*01:01', cigar, *releases))
+        legacy = generate_cigar(*gapped(old, new, cigar))
+        assert set(legacy) <= set('0123456789MID')
+        check_events(old, new, cigar_events('A*01:01', legacy, *releases))
+
+
+def test_coordinates_after_indel():
+    old = 'AAAACCCCGGGGTTTT'
+    new = 'AAAATTCCCCGGAGTTTT'
+    releases = {'A*01:01': old}, {'A*01:01': new}
+    expected = [
+        Variant('insertion', 4, 4, 4, 6, '', 'TT'),
+        Variant('substitution', 10, 11, 12, 13, 'G', 'A'),
+    ]
+    assert cigar_events('A*01:01', '4=2I6=1X5=', *releases) == expected
+    assert cigar_events('A*01:01', '4M2I12M', *releases) == expected
+    deleted = 'AAAAGGGGTTTT'
+    releases = {'A*01:01': old}, {'A*01:01': deleted}
+    assert cigar_events('A*01:01', '4=4D8=', *releases) == [Variant('deletion', 4, 8, 4, 4, 'CCCC', '')]
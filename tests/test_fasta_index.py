@@ -0,0 +1,123 @@
+import os
+import random
+
+import pytest
+
+from fasta_index import IndexedFasta, build_index, index_path, load_index, read_index, write_index
+
+
+"""
+checks every record, and a few slices of it, against the sequences written
+"""
+def check_release(path, records):
+    with IndexedFasta(path) as release:
+        assert sorted(release.keys()) == sorted(records)
+        for allele, sequence in records.items():
+            assert release[allele] == sequence
+            assert release.length(allele) == len(sequence)
+            for start, end in ((0, 1), (3, 17), (59, 61), (60, 120), (5, None), (len(sequence), None)):
+                assert release.fetch(allele, start, end) == sequence[start:end]
+
+
+def test_regular_lines(tmp_path, fasta_records, write_fasta):
+    path = str(tmp_path / 'A_gen.fasta')
+    write_fasta(path, fasta_records, 60)
+    assert all(record[2] == 60 for allele, record in build_index(path).items() if len(fasta_records[allele]) > 60)
+    check_release(path, fasta_records)
+
+
+def test_irregular_lines(tmp_path, fasta_records):
+    path = str(tmp_path / 'A_gen.fasta')
+    with open(path, 'w') as f:
+        for allele, sequence in fasta_records.items():
+            f.write(f'>HLA:HLA00001 {allele} {len(sequence)} bp\n')
+            f.write(sequence[:7] + '\n' + sequence[7:50] + '\n' + sequence[50:] + '\n')
+    assert build_index(path)['A*01:01:01:01'][2] == 0
+    check_release(path, fasta_records)
+
+
+"""
+writes every record with the given line lengths, the last line getting the
+rest of the sequence
+"""
+def write_lines(path, records, lengths, newline='\n'):
+    with open(path, 'w', newline='') as f:
+        for allele, sequence in records.items():
+            f.write(f'>HLA:HLA00001 {allele} {len(sequence)} bp{newline}')
+            start = 0
+            for length in lengths:
+                if start < len(sequence):
+                    f.write(sequence[start:start + length] + newline)
+                start += length
+            if start < len(sequence):
+                f.write(sequence[start:] + newline)
+
+
+@pytest.mark.parametrize('lengths', [(5, 3, 5), (5, 6)])
+def test_irregular_lines_with_regular_total(tmp_path, lengths):
+    records = {'A*01:01': 'ACGTTGCAACCGGTA'}
+    path = str(tmp_path / 'A_gen.fasta')
+    write_lines(path, records, lengths)
+    assert build_index(path)['A*01:01'][2] == 0
+    with IndexedFasta(path) as release:
+        sequence = records['A*01:01']
+        assert release['A*01:01'] == sequence
+        assert [release.fetch('A*01:01', start, start + 1) for start in range(len(sequence))] == list(sequence)
+
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_random_line_layouts(tmp_path, newline):
+    rng = random.Random(len(newline))
+    path = str(tmp_path / 'A_gen.fasta')
+    for _ in range(200):
+        sequence = ''.join(rng.choices('ACGT', k=rng.randint(1, 40)))
+        width = rng.randint(1, 8)
+        lengths = [width if rng.random() < 0.8 else rng.randint(1, 8) for _ in range(rng.randint(0, 6))]
+        write_lines(path, {'A*01:01': sequence}, lengths, newline)
+        with IndexedFasta(path) as release:
+            assert release['A*01:01'] == sequence
+            for start in range(len(sequence)):
+                end = rng.randint(start, len(sequence))
+                assert release.fetch('A*01:01', start, end) == sequence[start:end]
+        os.remove(index_path(path))
+
+
+def test_crlf_lines(tmp_path, fasta_records, write_fasta):
+    path = str(tmp_path / 'A_gen.fasta')
+    write_fasta(path, fasta_records, 60, '\r\n')
+    length, offset, line_bases, line_width, _ = build_index(path)['A*01:01:01:01']
+    assert (line_bases, line_width) == (60, 62)
+    check_release(path, fasta_records)
+
+
+def test_index_round_trip(tmp_path, fasta_records, write_fasta):
+    path = str(tmp_path / 'A_gen.fasta')
+    write_fasta(path, fasta_records, 10)
+    index = load_index(path)
+    assert os.path.exists(index_path(path))
+    assert read_index(index_path(path)) == index
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+    write_index(index, index_path(path))
+    assert read_index(index_path(path)) == index
+
+
+def test_missing_allele(tmp_path, fasta_records, write_fasta):
+    path = str(tmp_path / 'A_gen.fasta')
+    write_fasta(path, fasta_records)
+    with IndexedFasta(path) as release:
+        assert 'B*07:02' not in release
+        with pytest.raises(KeyError):
+            release['B*07:02']
+
+
+def test_stale_index_is_rebuilt(tmp_path, fasta_records, write_fasta):
+    path = str(tmp_path / 'A_gen.fasta')
+    write_fasta(path, fasta_records)
+    old_stat = os.stat(path)
+    with IndexedFasta(path) as release:
+        assert len(release) == len(fasta_records)
+    replaced = dict(fasta_records, **{'A*02:01:01': 'GATTACC', 'A*04:01': 'CCCC'})
+    write_fasta(path, replaced)
+    os.utime(path, ns=(old_stat.st_atime_ns, old_stat.st_mtime_ns - 10 ** 9))
+    assert os.path.getmtime(index_path(path)) > os.path.getmtime(path)
+    check_release(path, replaced)
@@ -0,0 +1,31 @@
+import os
+
+from describe_modifications import Variant
+from feature_index import annotate_events, build_feature_index, feature_at, read_alignment
+
+ALIGNMENT = os.path.join(os.path.dirname(__file__), 'data', 'A_gen.txt')
+NAMES = ('5UTR', 'EX_1', 'INT_1', '3UTR')
+
+
+def test_read_alignment_joins_blocks():
+    rows = read_alignment(ALIGNMENT)
+    assert list(rows) == ['A*01:01:01:01', 'A*01:02', 'A*01:03']
+    assert rows['A*01:01:01:01'] == 'CAGGA|GCAGAGGGGT|CAGG.GCG|AAGTCCCA'
+    assert rows['A*01:02'] == '..--*|--T-......|----.---|--------'
+
+
+def test_feature_starts():
+    index = build_feature_index(ALIGNMENT)
+    assert index['A*01:01:01:01'] == ((0, 5, 15, 22), NAMES)
+    assert index['A*01:02'] == ((0, 2, 6, 13), NAMES)
+    assert index['A*01:03'] == ((0, 5, 15, 23), NAMES)
+
+
+def test_annotate_events():
+    index = build_feature_index(ALIGNMENT)
+    events = [Variant('substitution', position, position + 1, position, position + 1, 'A', 'C')
+              for position in (0, 1, 2, 5, 6, 12, 13, 20)]
+    features = [feature for _, feature in annotate_events(index, 'A*01:02', events)]
+    assert features == ['5UTR', '5UTR', 'EX_1', 'EX_1', 'INT_1', 'INT_1', '3UTR', '3UTR']
+    assert features == [feature_at(index, 'A*01:02', event.old_start) for event in events]
+    assert annotate_events(index, 'B*07:02', events[:1]) == [(events[0], None)]
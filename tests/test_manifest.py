@@ -0,0 +1,38 @@
+import json
+import os
+
+import manifest
+from create_report import same_file
+from manifest import MANIFEST_NAME, load_manifest
+
+
+def test_same_file_hashes_only_the_two_files(tmp_path, monkeypatch):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    (tmp_path / 'a' / 'A_gen.fasta').write_text('>x A*01:01 4 bp\nACGT\n')
+    (tmp_path / 'b' / 'A_gen.fasta').write_text('>x A*01:01 4 bp\nACGT\n')
+    (tmp_path / 'a' / 'hla_gen.fasta').write_text('>x A*01:01 8 bp\nACGTACGT\n')
+    hashed = []
+    file_digest = manifest.file_digest
+    monkeypatch.setattr(manifest, 'file_digest', lambda file: hashed.append(file) or file_digest(file))
+    assert same_file(str(tmp_path / 'a' / 'A_gen.fasta'), str(tmp_path / 'b' / 'A_gen.fasta'))
+    assert sorted(os.path.basename(file) for file in hashed) == ['A_gen.fasta', 'A_gen.fasta']
+    with open(tmp_path / 'a' / MANIFEST_NAME) as f:
+        assert list(json.load(f)) == ['A_gen.fasta']
+    assert same_file(str(tmp_path / 'a' / 'A_gen.fasta'), str(tmp_path / 'b' / 'A_gen.fasta'))
+    assert len(hashed) == 2
+    assert sorted(load_manifest(str(tmp_path / 'a'))) == ['A_gen.fasta', 'hla_gen.fasta']
+
+
+def test_same_file_size_mismatch_does_not_hash(tmp_path, monkeypatch):
+    (tmp_path / 'A_gen.fasta').write_text('ACGT\n')
+    (tmp_path / 'B_gen.fasta').write_text('ACGTA\n')
+    monkeypatch.setattr(manifest, 'file_digest', lambda file: 1 / 0)
+    assert not same_file(str(tmp_path / 'A_gen.fasta'), str(tmp_path / 'B_gen.fasta'))
+    assert not (tmp_path / MANIFEST_NAME).exists()
+
+
+def test_same_file_different_content(tmp_path):
+    (tmp_path / 'A_gen.fasta').write_text('ACGT\n')
+    (tmp_path / 'B_gen.fasta').write_text('ACGA\n')
+    assert not same_file(str(tmp_path / 'A_gen.fasta'), str(tmp_path / 'B_gen.fasta'))
@@ -0,0 +1,37 @@
+import pickle
+import random
+
+import pytest
+
+from fasta_index import sequence_digest
+from packed_sequence import PackedSequence, pack_release
+
+
+def test_packed_sequence_behaves_like_str():
+    rng = random.Random(8)
+    for _ in range(2000):
+        sequence = ''.join(rng.choices('ACGT' * 6 + 'N*RY', k=rng.randint(0, 40)))
+        packed = PackedSequence(sequence)
+        assert len(packed) == len(sequence)
+        assert str(packed) == sequence and bytes(packed) == sequence.encode()
+        start, stop = rng.randint(-45, 45), rng.randint(-45, 45)
+        assert packed[start:stop] == sequence[start:stop]
+        assert packed[::2] == sequence[::2]
+        if sequence:
+            index = rng.randint(-len(sequence), len(sequence) - 1)
+            assert packed[index] == sequence[index]
+        for item in ('*', 'N', 'A', 'AC'):
+            assert (item in packed) == (item in sequence)
+        assert packed.digest() == sequence_digest(sequence)
+        copy = pickle.loads(pickle.dumps(packed))
+        assert copy == packed and hash(copy) == hash(packed) and str(copy) == sequence
+        other = PackedSequence(sequence + 'A')
+        assert other != packed
+
+
+def test_packed_sequence_errors_and_release():
+    packed = PackedSequence('ACGTN')
+    with pytest.raises(IndexError):
+        packed[5]
+    assert packed.nbytes() < len('ACGTN') * 4
+    assert {allele: str(sequence) for allele, sequence in pack_release({'A*01:01': 'ACGT'}).items()} == {'A*01:01': 'ACGT'}
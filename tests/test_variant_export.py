@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from align_alleles import align_pair
+from variant_export import export_variants, read_variant_index, variants_at
+
+
+"""
+returns:
+    the sequence with a few random substitutions, insertions and deletions
+"""
+def mutate(sequence, rng):
+    for _ in range(rng.randint(1, 4)):
+        position = rng.randrange(len(sequence))
+        change = rng.random()
+        if change < 0.5:
+            sequence = sequence[:position] + rng.choice('ACGT') + sequence[position + 1:]
+        elif change < 0.75:
+            sequence = sequence[:position] + ''.join(rng.choices('ACGT', k=rng.randint(1, 3))) + sequence[position:]
+        else:
+            sequence = sequence[:position] + sequence[position + rng.randint(1, 3):]
+    return sequence
+
+
+@pytest.fixture
+def variant_file(tmp_path):
+    rng = random.Random(10)
+    old, new = {}, {}
+    for locus in ('A', 'B', 'DRB1'):
+        for number in range(1, 6):
+            allele = f'{locus}*{number:02d}:01'
+            old[allele] = ''.join(rng.choices('ACGT', k=60))
+            new[allele] = mutate(old[allele], rng)
+    report = tmp_path / 'report.txt'
+    with open(report, 'w') as f:
+        f.write('Results: \n')
+        for allele in old:
+            f.write(f'Modified,{allele},\n{align_pair(new[allele], old[allele])}\n')
+    output_file = str(tmp_path / 'variants.tsv')
+    assert export_variants(old, new, str(report), output_file) > 0
+    return output_file
+
+
+"""
+returns:
+    every record of the variant file, read from the start
+"""
+def scan(variant_file):
+    records = []
+    with open(variant_file, 'r') as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            allele, locus, position, ref, alt, kind, new_position, feature = line.rstrip('\n').split('\t')
+            records.append((allele, locus, int(position), ref, alt, kind, int(new_position), feature))
+    return records
+
+
+def test_variants_at_matches_scan(variant_file):
+    records = scan(variant_file)
+    index = read_variant_index(variant_file)
+    assert sorted(index['loci']) == ['A', 'B', 'DRB1']
+    for locus in index['loci']:
+        for position in range(0, 65):
+            expected = [record for record in records if record[1] == locus and record[2] == position]
+            assert variants_at(variant_file, locus, position, index=index) == expected
+            for end in (position, position + 1, position + 7, 100):
+                expected = [record for record in records if record[1] == locus and position <= record[2] <= end]
+                assert variants_at(variant_file, locus, position, end, index) == expected
+
+
+def test_variants_at_outside_records(variant_file):
+    assert variants_at(variant_file, 'C', 1, 100) == []
+    last = max(record[2] for record in scan(variant_file) if record[1] == 'DRB1')
+    assert variants_at(variant_file, 'DRB1', last + 1, last + 50) == []
+    assert variants_at(variant_file, 'A', 5, 4) == []
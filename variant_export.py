@@ -0,0 +1,129 @@
+import json
+from bisect import bisect_left
+
+from describe_modifications import cigar_events, report_cigars
+from fasta_index import IndexedFasta
+from feature_index import annotate_events
+from report_db import allele_locus
+
+
+# columns of a variant file
+COLUMNS = ('ALLELE', 'LOCUS', 'POS', 'REF', 'ALT', 'TYPE', 'NEW_POS', 'FEATURE')
+
+
+"""
+parameters:
+    variant_file: the variant file
+
+returns:
+    path of the index saved next to the variant file
+"""
+def variant_index_path(variant_file):
+    return f'{variant_file}.idx'
+
+
+"""
+writes every change of every modified allele in a report as one tab separated
+VCF-like record:
+    ALLELE LOCUS POS REF ALT TYPE NEW_POS FEATURE
+POS and NEW_POS are 1 based positions in the old and new sequence (for an
+insertion, the old base the new bases are inserted before), FEATURE is the
+exon, intron or UTR of the old base (see feature_index.py) and '.' is used
+for an empty REF, ALT or FEATURE. records are sorted by locus and position and
+written in bulk. an index of the byte offset of every locus and position is
+saved as json next to the file (see variants_at)
+
+parameters:
+    old_dict: the old release (fasta file, IndexedFasta or dictionary of the form allele: sequence)
+    new_dict: the new release (fasta file, IndexedFasta or dictionary of the form allele: sequence)
+    report: the report to read from (text report, or sqlite report from report_db.py)
+    output_file: the file to write to
+    buffer_size: size of the write buffer in bytes
+    features: feature index of the old release from feature_index.py
+
+returns:
+    the number of records written
+"""
+def export_variants(old_dict, new_dict, report, output_file, buffer_size=1 << 20, features=None):
+    old_release = IndexedFasta(old_dict) if isinstance(old_dict, str) else old_dict
+    new_release = IndexedFasta(new_dict) if isinstance(new_dict, str) else new_dict
+    records = []
+    try:
+        for allele, cigar_string in report_cigars(report):
+            locus = allele_locus(allele)
+            events = cigar_events(allele, cigar_string, old_release, new_release)
+            for event, feature in annotate_events(features or {}, allele, events):
+                records.append((locus, event.old_start + 1, allele, event.ref or '.', event.alt or '.',
+                                event.kind, event.new_start + 1, feature or '.'))
+    finally:
+        if isinstance(old_dict, str):
+            old_release.close()
+        if isinstance(new_dict, str):
+            new_release.close()
+    records.sort()
+    index = {}
+    offset = 0
+    with open(output_file, 'w', buffering=buffer_size) as f:
+        header = '#' + '\t'.join(COLUMNS) + '\n'
+        lines = [header]
+        offset += len(header.encode())
+        for locus, position, allele, ref, alt, kind, new_position, feature in records:
+            positions = index.setdefault(locus, [[], []])
+            if not positions[0] or positions[0][-1] != position:
+                positions[0].append(position)
+                positions[1].append(offset)
+            line = f'{allele}\t{locus}\t{position}\t{ref}\t{alt}\t{kind}\t{new_position}\t{feature}\n'
+            lines.append(line)
+            offset += len(line.encode())
+        f.writelines(lines)
+    with open(variant_index_path(output_file), 'w') as f:
+        json.dump({'end': offset, 'loci': index}, f)
+    return len(records)
+
+
+"""
+parameters:
+    variant_file: file written by export_variants
+
+returns:
+    the index saved next to the file
+"""
+def read_variant_index(variant_file):
+    with open(variant_index_path(variant_file), 'r') as f:
+        return json.load(f)
+
+
+"""
+reads only the records of one locus at a position (or in a range of
+positions), using the index saved by export_variants
+
+parameters:
+    variant_file: file written by export_variants
+    locus: the locus, i.e. A
+    position: first old position (1 based)
+    end: last old position, defaults to position
+    index: index from read_variant_index, read from disk if not given
+
+returns:
+    list of (allele, locus, position, ref, alt, type, new_position, feature) records
+"""
+def variants_at(variant_file, locus, position, end=None, index=None):
+    if index is None:
+        index = read_variant_index(variant_file)
+    end = position if end is None else end
+    if locus not in index['loci']:
+        return []
+    positions, offsets = index['loci'][locus]
+    first = bisect_left(positions, position)
+    if first == len(positions) or positions[first] > end:
+        return []
+    output = []
+    with open(variant_file, 'rb') as f:
+        f.seek(offsets[first])
+        for line in f:
+            allele, record_locus, record_position, ref, alt, kind, new_position, feature = \
+                line.decode().rstrip('\n').split('\t')
+            if record_locus != locus or int(record_position) > end:
+                break
+            output.append((allele, record_locus, int(record_position), ref, alt, kind, int(new_position), feature))
+    return output